@@ -0,0 +1,213 @@
+import json
+from datetime import datetime
+from functools import wraps
+from hashlib import sha1
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+
+import cache
+import lookups
+import queries
+import search
+from models import Venue, Artist
+
+# Read-only JSON API over the same queries as the HTML pages.
+#
+# Every response carries an ETag (a hash of the body) and is cached by URL in
+# the page cache, so a client polling with If-None-Match gets a 304 without a
+# query or serialization as long as nothing was written in between. Responses
+# that are not cached any more are rebuilt, but still answer 304 if the body
+# did not change. There is no Last-Modified: the time a response was built says
+# nothing about its rows, and a deleted row would not move the latest
+# updated_at of the others forward.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def conditional(view):
+    # views return a JSON-serializable payload and the time at which the
+    # payload goes stale on its own (None if only writes change it)
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = f'api:{cache.api_generation()}:{request.full_path}'
+        entry = cache.page_cache.get(key)
+
+        if entry is None:
+            payload, expires_at = view(*args, **kwargs)
+            body = json.dumps(payload, default=json_default, separators=(',', ':'))
+            entry = {
+                'body': body,
+                'etag': sha1(body.encode()).hexdigest()
+            }
+            cache.page_cache.set(key, entry, expires_at=expires_at)
+
+        response = Response(entry['body'], mimetype='application/json')
+        response.set_etag(entry['etag'])
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    return wrapper
+
+
+def genre_arguments():
+    try:
+        return queries.genre_arguments(request.args.getlist('genre'), request.args.get('match'))
+    except ValueError as e:
+        abort(400, str(e))
+
+
+def page_arguments():
+    per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+    page = max(request.args.get('page', 1, type=int), 1)
+    return per_page, (page - 1) * per_page
+
+
+def options(kind):
+    # a page of the options of the venue or artist picker of the show forms
+    per_page, offset = page_arguments()
+    data = lookups.options(kind, request.args.get('q', ''), per_page, offset)
+    data['next_page'] = offset // per_page + 2 if offset + per_page < data['count'] else None
+    return data, None
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return jsonify({'error': error.code, 'message': error.description}), error.code
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+@conditional
+def venues():
+    genres, match = genre_arguments()
+
+    try:
+        areas, next_cursor = queries.venues_page(current_app.config['VENUES_PER_PAGE'], after=request.args.get('after'),
+                                                 genres=genres, match=match)
+    except ValueError:
+        abort(400, 'invalid cursor')
+
+    facets = queries.genre_facets(Venue, *queries.genre_criteria(Venue, genres, match))
+
+    return {'areas': areas, 'next_cursor': next_cursor, 'facets': facets}, None
+
+
+@api.route('/venues/search')
+@conditional
+def search_venues():
+    per_page, offset = page_arguments()
+    genres, match = genre_arguments()
+    return search.search_venues(request.args.get('q', ''), per_page, offset, genres, match), None
+
+
+@api.route('/venues/options')
+@conditional
+def venue_options():
+    return options('venue')
+
+
+@api.route('/venues/<int:venue_id>')
+@conditional
+def venue(venue_id):
+    data = queries.venue_detail(venue_id)
+
+    if not data:
+        abort(404, f'no venue with id {venue_id}')
+
+    return data, data.pop('next_show_time')
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+@conditional
+def artists():
+    genres, match = genre_arguments()
+
+    try:
+        data, next_cursor = queries.artists_page(current_app.config['ARTISTS_PER_PAGE'], after=request.args.get('after'),
+                                                 genres=genres, match=match)
+    except ValueError:
+        abort(400, 'invalid cursor')
+
+    facets = queries.genre_facets(Artist, *queries.genre_criteria(Artist, genres, match))
+
+    return {'data': data, 'next_cursor': next_cursor, 'facets': facets}, None
+
+
+@api.route('/artists/search')
+@conditional
+def search_artists():
+    per_page, offset = page_arguments()
+    genres, match = genre_arguments()
+    return search.search_artists(request.args.get('q', ''), per_page, offset, genres, match), None
+
+
+@api.route('/artists/options')
+@conditional
+def artist_options():
+    return options('artist')
+
+
+@api.route('/artists/<int:artist_id>')
+@conditional
+def artist(artist_id):
+    data = queries.artist_detail(artist_id)
+
+    if not data:
+        abort(404, f'no artist with id {artist_id}')
+
+    return data, data.pop('next_show_time')
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+@conditional
+def shows():
+    include_past = request.args.get('past') == '1'
+
+    try:
+        data, next_cursor = queries.shows_page(
+            current_app.config['SHOWS_PER_PAGE'],
+            after=request.args.get('after'),
+            include_past=include_past
+        )
+    except ValueError:
+        abort(400, 'invalid cursor')
+
+    # the upcoming-only feed changes when its first show starts
+    expires_at = data[0]['start_time'] if data and not include_past else None
+
+    return {'data': data, 'next_cursor': next_cursor}, expires_at
+
+
+@api.route('/shows/search')
+@conditional
+def search_shows():
+    per_page, offset = page_arguments()
+    include_past = request.args.get('past') == '1'
+    data = search.search_shows(request.args.get('q', ''), per_page, offset, include_past)
+    return data, data.pop('next_show_time')
+
+
+@api.route('/shows/<int:show_id>')
+@conditional
+def show(show_id):
+    data = queries.show_detail(show_id)
+
+    if not data:
+        abort(404, f'no show with id {show_id}')
+
+    return data, None
@@ -2,172 +2,211 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import sys
 import json
-import dateutil.parser
+import hashlib
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+import babel.dates
+from functools import lru_cache
+from flask import Flask, Blueprint, current_app, render_template, stream_with_context, request, Response, flash, redirect, url_for, abort, make_response, before_render_template, template_rendered
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
+from markupsafe import Markup
+from jinja2.environment import TemplateStream
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from forms import *
+from config import configs
+from extensions import db, init_migrate
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+main = Blueprint('main', __name__)
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 from models import *
+import queries
+import search
+import cache
+import stats
+import show_batch
+from api import api
+from assets import Assets
+from autocomplete import Autocomplete, autocomplete
+from compression import Compression, compression
+from importer import import_cli
+from instrumentation import QueryInstrumentation
+from metrics import Metrics
+from stats import ShowStats
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+# parsing the babel pattern and the locale is the expensive part of formatting,
+# so it is done once per (format, locale) instead of once per show tile
+@lru_cache(maxsize=32)
+def datetime_formatter(format, locale):
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  if isinstance(value, str):
+    # dateutil is imported on first use, the views pass datetimes
+    import dateutil.parser
+    value = dateutil.parser.parse(value)
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=babel.dates.UTC)
+  pattern, locale = datetime_formatter(format, locale)
+  return pattern.apply(value, locale)
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+# Listing pages are sent while they are rendered: the layout goes out before
+# the listing query has returned, and rows are rendered as they arrive (see
+# queries.Page). An error in the middle of the listing can no longer change
+# the status code, so everything that can fail early (e.g. cursor decoding)
+# happens before the response starts.
+
+STREAM_BUFFER_SIZE = 16
+
+def stream_template(template_name, **context):
+  app = current_app._get_current_object()
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+
+  # the signals render_template sends, so render times are recorded
+  def generate():
+    before_render_template.send(app, template=template, context=context)
+    yield from template.generate(context)
+    template_rendered.send(app, template=template, context=context)
+
+  stream = TemplateStream(generate())
+  # send the output in a few chunks rather than one write per template line
+  stream.enable_buffering(STREAM_BUFFER_SIZE)
+  return Response(stream_with_context(stream), mimetype='text/html')
+
+def cached_page(template_name, page):
+  # the ETag of a detail page follows from its cached fragment, so a client
+  # holding the current page gets a 304 without the layout being rendered
+  etag = compression.page_etag(page['etag'])
+  response = compression.not_modified(etag)
+  if response is None:
+    response = make_response(render_template(template_name, name=page['name'], body=Markup(page['body'])))
+    if etag is not None:
+      response.set_etag(etag, weak=True)
+  return response
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@main.route('/')
 def index():
   return render_template('pages/home.html')
 
+def genre_selection():
+  # ?genre=Jazz&genre=Folk&match=all, see genre_arguments in queries.py
+  try:
+    genres, match = queries.genre_arguments(request.values.getlist('genre'), request.values.get('match'))
+  except ValueError:
+    abort(400)
+
+  return {
+    'genres': genres,
+    'match': match,
+    # the filter arguments for links to other pages of the same listing
+    'args': {'genre': genres, 'match': match} if genres else {}
+  }
 
-#  Venues
-#  ----------------------------------------------------------------
+def genre_options(selection, facets):
+  # the facets plus the selected genres that match nothing
+  counts = {facet['genre']: facet['count'] for facet in facets}
+  return [(genre, counts.get(genre, 0)) for genre in queries.GENRES if genre in counts or genre in selection['genres']]
 
-@app.route('/venues')
-def venues():
-  # sort venues by state, then city, so rows with identical city+state will be adjacent
-  sorted_venues = Venue.query.order_by(Venue.state.asc()).order_by(Venue.city.asc()).all()
+def listing_facets(model, selection):
+  # listings are not cached, their facets are: they cover every matching row
+  genres, match = selection['genres'], selection['match']
+  key = f"facets:{model.__tablename__}:{match}:{'|'.join(genres)}"
+  facets = cache.cached(key, lambda: queries.genre_facets(model, *queries.genre_criteria(model, genres, match)))
+  return dict(selection, options=genre_options(selection, facets))
 
-  data = []
 
-  previous_city_state = {}
+#  Venues
+#  ----------------------------------------------------------------
 
-  for venue in sorted_venues:
-    city_state = { 'city': venue.city, 'state': venue.state }
+@main.route('/venues')
+def venues():
+  selection = genre_selection()
 
-    # create a new section only if the city_state dict has changed
-    if city_state != previous_city_state:
-      data.append({
-        'city': city_state['city'],
-        'state': city_state['state'],
-        'venues': []
-      })
-      previous_city_state = city_state
+  try:
+    page = queries.venues_stream(current_app.config['VENUES_PER_PAGE'], after=request.args.get('after'),
+                                 genres=selection['genres'], match=selection['match'])
+  except ValueError:
+    abort(400)
 
-    # in any case, append a venue to the last section
-    data[-1]['venues'].append({
-      'id': venue.id,
-      'name': venue.name,
-      'num_upcoming_shows': Show.query.filter_by(venue_id=venue.id).filter(Show.start_time>datetime.now()).count()
-    })      
+  index = queries.venue_states_index(selection['genres'], selection['match'])
+  selection = listing_facets(Venue, selection)
 
-  return render_template('pages/venues.html', areas=data)
+  return stream_template('pages/venues.html', areas=queries.venue_areas(page), index=index, page=page, genre_selection=selection)
 
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
+  search_term = request.values.get('search_term', '')
+  page = request.values.get('page', 1, type=int)
+  per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
 
-  term = request.form['search_term']
-  results = Venue.query.filter(Venue.name.ilike(f'%{term}%')).all()
-  
-  data = []
-  for venue in results:
-    data.append({
-      'id': venue.id,
-      'name': venue.name,
-      'num_upcoming_shows': Show.query.filter_by(venue_id=venue.id).filter(Show.start_time>datetime.now()).count()
-    })
-    
-  response={
-    'count': len(results),
-    'data': data
-  }
+  selection = genre_selection()
 
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  response = search.search_venues(search_term, per_page, offset=(max(page, 1) - 1) * per_page,
+                                  genres=selection['genres'], match=selection['match'])
+  selection = dict(selection, options=genre_options(selection, response['facets']))
 
-@app.route('/venues/<int:venue_id>')
+  return render_template('pages/search_venues.html', results=response, search_term=search_term, page=page, per_page=per_page, genre_selection=selection)
+
+@main.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
+  key = cache.venue_key(venue_id)
+  page = cache.page_cache.get(key)
 
-  venue = Venue.query.get(venue_id)
+  if page is None:
+    data = queries.venue_detail(venue_id)
 
-  if not venue:
-    return render_template('errors/404.html')
+    if not data:
+      return render_template('errors/404.html')
 
-  past_shows_result = Show.query.filter_by(venue_id=venue.id).filter(Show.start_time<datetime.now()).all()
-  upcoming_shows_result = Show.query.filter_by(venue_id=venue.id).filter(Show.start_time>datetime.now()).all()
-
-  past_shows = []
-  upcoming_shows = []
-
-  for show in past_shows_result:
-    past_shows.append({
-      'artist_id': show.artist.id,
-      'artist_name': show.artist.name,
-      'artist_image_link': show.artist.image_link,
-      'start_time': show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-    })
-
-  for show in upcoming_shows_result:
-    upcoming_shows.append({
-      'artist_id': show.artist.id,
-      'artist_name': show.artist.name,
-      'artist_image_link': show.artist.image_link,
-      'start_time': show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-  })
-
-  data = {
-    'id': venue.id,
-    'name': venue.name,
-    'genres': venue.genres,
-    'city': venue.city,
-    'state': venue.state,
-    'address': venue.address,
-    'phone': venue.phone,
-    'website': venue.website,
-    'facebook_link': venue.facebook_link,
-    'seeking_talent': venue.seeking_talent,
-    'seeking_description': venue.seeking_description,
-    'image_link': venue.image_link,
-    'past_shows': past_shows,
-    'past_shows_count': len(past_shows),
-    'upcoming_shows': upcoming_shows,
-    'upcoming_shows_count': len(upcoming_shows),
-  }
+    body = render_template('fragments/venue_detail.html', venue=data)
+    page = {
+      'name': data['name'],
+      'body': body,
+      'etag': hashlib.sha1(body.encode()).hexdigest()
+    }
+    cache.page_cache.set(key, page, expires_at=data['next_show_time'])
 
-  return render_template('pages/show_venue.html', venue=data)
+  return cached_page('pages/show_venue.html', page)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   # creating a new instance of Venue as outlined in the sqlalchemy docs:
   # https://docs.sqlalchemy.org/en/14/orm/tutorial.html#create-an-instance-of-the-mapped-class
@@ -190,6 +229,8 @@ def create_venue_submission():
       seeking_description = request.form['seeking_description']
     )
     db.session.add(venue)
+    db.session.flush()
+    venue_id = venue.id
     db.session.commit()  
   except:
     error = True
@@ -201,10 +242,12 @@ def create_venue_submission():
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
     return render_template('pages/home.html')
   else:
+    cache.invalidate_api()
+    autocomplete.add('venue', venue_id, request.form['name'])
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
     return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
 
   venue = Venue.query.filter_by(id=venue_id)
@@ -215,7 +258,9 @@ def delete_venue(venue_id):
 
   error = False
   try:
+    artist_ids = cache.venue_artist_ids(venue_id)
     venue.delete()
+    stats.refresh_shows([venue_id], artist_ids)
     db.session.commit()
   except:
     error = True
@@ -230,99 +275,66 @@ def delete_venue(venue_id):
     # sadly, I could not find a way to get this url with the flash
     # message to load after pressing the button on the venues page,
     # but it works when sending a DELETE request in Postman.
+    cache.invalidate_venue(venue_id, artist_ids)
+    autocomplete.remove('venue', venue_id)
     flash('Venue ' + venue_id + ' was successfully deleted!')
     return render_template('pages/venues.html')
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
 def artists():
+  selection = genre_selection()
 
-  artists = Artist.query.all()
-
-  data = []
+  try:
+    data, next_cursor = queries.artists_page(current_app.config['ARTISTS_PER_PAGE'], after=request.args.get('after'),
+                                             genres=selection['genres'], match=selection['match'])
+  except ValueError:
+    abort(400)
 
-  for artist in artists:
-    data.append({
-      'id': artist.id,
-      'name': artist.name
-    }) 
+  index = queries.artist_letters_index(selection['genres'], selection['match'])
+  selection = listing_facets(Artist, selection)
 
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, index=index, next_cursor=next_cursor, genre_selection=selection)
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-  term = request.form['search_term']
-  results = Artist.query.filter(Artist.name.ilike(f'%{term}%')).all()
-  
-  data = []
-  for artist in results:
-    data.append({
-      'id': artist.id,
-      'name': artist.name,
-      'num_upcoming_shows': Show.query.filter_by(artist_id=artist.id).filter(Show.start_time>datetime.now()).count()
-    })
-    
-  response={
-    'count': len(results),
-    'data': data
-  }
+  search_term = request.values.get('search_term', '')
+  page = request.values.get('page', 1, type=int)
+  per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+
+  selection = genre_selection()
 
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  response = search.search_artists(search_term, per_page, offset=(max(page, 1) - 1) * per_page,
+                                   genres=selection['genres'], match=selection['match'])
+  selection = dict(selection, options=genre_options(selection, response['facets']))
 
-@app.route('/artists/<int:artist_id>')
+  return render_template('pages/search_artists.html', results=response, search_term=search_term, page=page, per_page=per_page, genre_selection=selection)
+
+@main.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
+  key = cache.artist_key(artist_id)
+  page = cache.page_cache.get(key)
 
-  artist = Artist.query.get(artist_id)
+  if page is None:
+    data = queries.artist_detail(artist_id)
 
-  if not artist:
-    return render_template('errors/404.html')
+    if not data:
+      return render_template('errors/404.html')
 
-  past_shows_result = Show.query.filter_by(artist_id=artist.id).filter(Show.start_time<datetime.now()).all()
-  upcoming_shows_result = Show.query.filter_by(artist_id=artist.id).filter(Show.start_time>datetime.now()).all()
-
-  past_shows = []
-  upcoming_shows = []
-
-  for show in past_shows_result:
-    past_shows.append({
-      'venue_id': show.venue.id,
-      'venue_name': show.venue.name,
-      'venue_image_link': show.venue.image_link,
-      'start_time': show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-    })
-
-  for show in upcoming_shows_result:
-    upcoming_shows.append({
-      'venue_id': show.venue.id,
-      'venue_name': show.venue.name,
-      'venue_image_link': show.venue.image_link,
-      'start_time': show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-  })
-
-  data = {
-    'id': artist.id,
-    'name': artist.name,
-    'genres': artist.genres,
-    'city': artist.city,
-    'state': artist.state,
-    'phone': artist.phone,
-    'website': artist.website,
-    'facebook_link': artist.facebook_link,
-    'seeking_venue': artist.seeking_venue,
-    'seeking_description': artist.seeking_description,
-    'image_link': artist.image_link,
-    'past_shows': past_shows,
-    'past_shows_count': len(past_shows),
-    'upcoming_shows': upcoming_shows,
-    'upcoming_shows_count': len(upcoming_shows),
-  }
+    body = render_template('fragments/artist_detail.html', artist=data)
+    page = {
+      'name': data['name'],
+      'body': body,
+      'etag': hashlib.sha1(body.encode()).hexdigest()
+    }
+    cache.page_cache.set(key, page, expires_at=data['next_show_time'])
 
-  return render_template('pages/show_artist.html', artist=data)
+  return cached_page('pages/show_artist.html', page)
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
 
@@ -355,15 +367,22 @@ def edit_artist(artist_id):
   form.website_link.data = artist.website
   form.seeking_venue.data = artist.seeking_venue
   form.seeking_description.data = artist.seeking_description
+  form.version.data = artist.version
 
   return render_template('forms/edit_artist.html', form=form, artist=data)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   error = False
+  conflict = False
   artist = Artist.query.get(artist_id)
 
   try:
+    # the form was filled from the version it sends back; if the artist was
+    # saved since, these changes would silently overwrite that save
+    if request.form.get('version', type=int) != artist.version:
+      raise StaleDataError(f'artist {artist_id} is at version {artist.version}')
+
     artist.name = request.form['name']
     artist.city = request.form['city']
     artist.state = request.form['state']
@@ -376,19 +395,28 @@ def edit_artist_submission(artist_id):
     artist.seeking_description = request.form['seeking_description']
 
     db.session.commit()
+  except StaleDataError:
+    # also raised by the commit when a concurrent request updated the row
+    conflict = True
+    db.session.rollback()
   except: 
     error = True
     db.session.rollback()
     print(sys.exc_info())
   finally:
     db.session.close()
+  if conflict:
+    flash('Artist ' + request.form['name'] + ' was changed by someone else while you were editing it. Check the current values and submit your changes again.')
+    return redirect(url_for('main.edit_artist', artist_id=artist_id))
   if error: 
     flash('An error occurred. Artist ' + request.form['name']+ ' could not be changed.')
   else: 
+    cache.invalidate_artist(artist_id)
+    autocomplete.add('artist', artist_id, request.form['name'])
     flash('Artist ' + request.form['name'] + ' was successfully changed!')
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   form = VenueForm()
 
@@ -423,15 +451,22 @@ def edit_venue(venue_id):
   form.website_link.data = venue.website
   form.seeking_talent.data = venue.seeking_talent
   form.seeking_description.data = venue.seeking_description
+  form.version.data = venue.version
 
   return render_template('forms/edit_venue.html', form=form, venue=data)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   error = False
+  conflict = False
   venue = Venue.query.get(venue_id)
 
   try:
+    # the form was filled from the version it sends back; if the venue was
+    # saved since, these changes would silently overwrite that save
+    if request.form.get('version', type=int) != venue.version:
+      raise StaleDataError(f'venue {venue_id} is at version {venue.version}')
+
     venue.name = request.form['name']
     venue.city = request.form['city']
     venue.state = request.form['state']
@@ -445,27 +480,36 @@ def edit_venue_submission(venue_id):
     venue.seeking_description = request.form['seeking_description']
 
     db.session.commit()
+  except StaleDataError:
+    # also raised by the commit when a concurrent request updated the row
+    conflict = True
+    db.session.rollback()
   except: 
     error = True
     db.session.rollback()
     print(sys.exc_info())
   finally:
     db.session.close()
+  if conflict:
+    flash('Venue ' + request.form['name'] + ' was changed by someone else while you were editing it. Check the current values and submit your changes again.')
+    return redirect(url_for('main.edit_venue', venue_id=venue_id))
   if error: 
     flash('An error occurred. Venue ' + request.form['name']+ ' could not be changed.')
   else: 
+    cache.invalidate_venue(venue_id)
+    autocomplete.add('venue', venue_id, request.form['name'])
     flash('Venue ' + request.form['name'] + ' was successfully changed!')
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # creating a new instance of Artist as outlined in the sqlalchemy docs:
   # https://docs.sqlalchemy.org/en/14/orm/tutorial.html#create-an-instance-of-the-mapped-class
@@ -487,6 +531,8 @@ def create_artist_submission():
       seeking_description = request.form['seeking_description']
     )
     db.session.add(artist)
+    db.session.flush()
+    artist_id = artist.id
     db.session.commit()
   except:
     error = True
@@ -498,6 +544,8 @@ def create_artist_submission():
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
     return render_template('pages/home.html')
   else:
+    cache.invalidate_api()
+    autocomplete.add('artist', artist_id, request.form['name'])
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
     return render_template('pages/home.html')
 
@@ -505,88 +553,182 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
 def shows():
+  include_past = request.args.get('past') == '1'
+
+  try:
+    page = queries.shows_stream(
+      current_app.config['SHOWS_PER_PAGE'],
+      after=request.args.get('after'),
+      include_past=include_past
+    )
+  except ValueError:
+    abort(400)
 
-  shows = Show.query.all()
-  data = []
-
-  for show in shows:
-    data.append({
-      'venue_id': show.venue.id,
-      'venue_name': show.venue.name,
-      'artist_id': show.artist.id,
-      'artist_name': show.artist.name,
-      'artist_image_link': show.artist.image_link,
-      'start_time': show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-    })
-  return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
+  return stream_template('pages/shows.html', shows=page, page=page, include_past=include_past)
+
+@main.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # creating a new instance of Show as outlined in the sqlalchemy docs:
   # https://docs.sqlalchemy.org/en/14/orm/tutorial.html#create-an-instance-of-the-mapped-class
   #
   # try / except block based on the todo_app excercise from the tutorial
 
+  form = ShowForm(meta={'csrf': False})
+  if not form.validate():
+    flash('Show could not be listed: ' + '; '.join(f'{field}: {", ".join(errors)}' for field, errors in form.errors.items()))
+    return render_template('forms/new_show.html', form=form)
+
   error = False
+  conflict = None
   try:
     show = Show(
-      artist_id = request.form['artist_id'],
-      venue_id = request.form['venue_id'],
-      start_time = request.form['start_time']
+      artist_id = int(form.artist_id.data),
+      venue_id = int(form.venue_id.data),
+      start_time = form.start_time.data,
+      end_time = show_end_time(form.start_time.data, form.duration.data)
     )
-    db.session.add(show)
-    db.session.commit()
+    conflict = queries.show_conflict(show.venue_id, show.artist_id, show.start_time, show.end_time)
+    if conflict is None:
+      db.session.add(show)
+      stats.refresh_shows([show.venue_id], [show.artist_id])
+      db.session.commit()
+  except IntegrityError:
+    # a clashing show was listed since the check, Postgres' exclusion
+    # constraints caught it
+    db.session.rollback()
+    conflict = queries.show_conflict(show.venue_id, show.artist_id, show.start_time, show.end_time)
+    error = conflict is None
   except:
     error = True
     db.session.rollback()
     print(sys.exc_info())
   finally:
     db.session.close()
+  if conflict:
+    flash(show_conflict_message(conflict, int(form.venue_id.data)))
+    return render_template('forms/new_show.html', form=form)
   if error:
     flash('An error occurred. Show could not be listed.')
     return render_template('pages/home.html')
   else:
+    cache.invalidate_show(request.form['venue_id'], request.form['artist_id'])
     flash('Show was successfully listed!')
     return render_template('pages/home.html')
 
-@app.errorhandler(404)
+def show_conflict_message(conflict, venue_id):
+  booked = conflict['venue_name'] if conflict['venue_id'] == venue_id else conflict['artist_name']
+  return (f"Show could not be listed: {booked} is already booked from {format_datetime(conflict['start_time'])} "
+          f"to {format_datetime(conflict['end_time'])} for show {conflict['id']} "
+          f"({conflict['artist_name']} at {conflict['venue_name']}).")
+
+@main.route('/shows/create/batch', methods=['GET'])
+def create_show_batch_form():
+  form = ShowBatchForm()
+  return render_template('forms/new_show_batch.html', form=form)
+
+@main.route('/shows/create/batch', methods=['POST'])
+def create_show_batch_submission():
+  form = ShowBatchForm(meta={'csrf': False})
+  if not form.validate():
+    flash('Shows could not be listed: ' + '; '.join(f'{field}: {", ".join(errors)}' for field, errors in form.errors.items()))
+    return render_template('forms/new_show_batch.html', form=form)
+
+  try:
+    artist_id = int(form.artist_id.data)
+    slots = show_batch.plan(form)
+  except ValueError as e:
+    flash(f'Shows could not be listed: {e}')
+    return render_template('forms/new_show_batch.html', form=form)
+
+  error = False
+  listed = False
+  try:
+    listed = show_batch.list_shows(artist_id, slots)
+  except:
+    error = True
+    db.session.rollback()
+    print(sys.exc_info())
+  finally:
+    db.session.close()
+  if error:
+    flash('An error occurred. Shows could not be listed.')
+  elif listed:
+    for venue_id in {slot['venue_id'] for slot in slots}:
+      cache.invalidate_show(venue_id, artist_id)
+    flash(f'{len(slots)} shows were successfully listed!')
+  else:
+    flash(f"No show was listed, {sum(1 for slot in slots if slot['errors'])} of {len(slots)} cannot be booked.")
+  return render_template('forms/new_show_batch.html', form=form, slots=slots, listed=listed)
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
+#----------------------------------------------------------------------------#
+# App Factory.
+#----------------------------------------------------------------------------#
+
+def create_app(config_name=None, **settings):
+  # FYYUR_ENV picks one of the configurations in config.py, settings
+  # override single values of it
+  config_name = config_name or os.environ.get('FYYUR_ENV', 'development')
+
+  app = Flask(__name__)
+  app.config.from_object(configs[config_name])
+  app.config.update(settings)
+
+  if not app.config['SECRET_KEY']:
+    raise RuntimeError('SECRET_KEY is not set')
+
+  db.init_app(app)
+  init_migrate(app)
+  # every app gets its own instances, see extensions.py
+  cache.PageCache(app)
+  QueryInstrumentation(app)
+  Metrics(app)
+  ShowStats(app)
+  Assets(app)
+  Autocomplete(app)
+  # after_request hooks run in reverse order: compression has to come last
+  # so the others see the final response
+  Compression(app)
+
+  app.register_blueprint(main)
+  app.register_blueprint(api)
+  app.cli.add_command(import_cli)
+  app.jinja_env.filters['datetime'] = format_datetime
+
+  if not app.debug and not app.testing:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+      Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
     )
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+  return app
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
-# Default port:
-if __name__ == '__main__':
-    app.run()
-
-# Or specify port manually:
-'''
-if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
-'''
+# `flask run` finds create_app on its own. wsgi.py is the entry point for
+# gunicorn or uwsgi and runs the development server when started directly:
+#
+#   python wsgi.py
+#   gunicorn -c gunicorn.conf.py wsgi:app
@@ -0,0 +1,250 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+from werkzeug.security import safe_join
+
+from extensions import app_extension
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bundled, minified and fingerprinted static assets.
+#
+# `flask assets build` concatenates the files of each bundle below, minifies
+# CSS, and writes the result to static/dist under a name containing a hash of
+# its content, next to gzip and brotli compressed copies (brotli is in
+# requirements.txt; without it only the gzip copies are written). static/dist/manifest.json maps bundle names to the
+# written files. Templates link bundles with
+#
+#   <link rel="stylesheet" href="{{ asset_url('css/fyyur.css') }}">
+#
+# Since a changed file gets a new name, the files are served with a one year,
+# immutable Cache-Control header, precompressed when the client accepts it.
+# Without a manifest, e.g. in a fresh checkout, the bundles are built on first
+# use; in debug mode they are rebuilt whenever a source file changes. Files
+# are written to temporary names and renamed into place, so several workers
+# building at once do not serve each other half-written files, but
+# deployments should run `flask assets build` before starting the server.
+
+assets_cli = AppGroup('assets', help='Build the static asset bundles.')
+
+# bundle name -> source files, relative to the static folder
+BUNDLES = {
+    'css/fyyur.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # loaded in <head>, before the page renders
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred, runs after jQuery
+    'js/fyyur.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+    # loaded on their own: the local jQuery fallback and respond.js for old IE
+    'js/jquery.js': ['js/libs/jquery-1.11.1.min.js'],
+    'js/respond.js': ['js/libs/respond-1.4.2.min.js'],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+TEMPORARY_SUFFIX = '.tmp'
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# (Accept-Encoding token, file suffix), in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(css):
+    # comments and whitespace only, which is safe for the stylesheets here
+    # (none has a comment marker or significant whitespace inside a string)
+    css = CSS_COMMENT.sub('', css)
+    css = CSS_SPACE.sub(' ', css)
+    css = CSS_PUNCTUATION.sub(r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def rebase_css_urls(css, source, static_url_path):
+    # relative url()s point next to the source file, not to static/dist
+    def rebase(match):
+        quote, url = match.groups()
+        if re.match(r'^([a-z]+:|/|#)', url):
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        return f'url({quote}{static_url_path}/{path}{quote})'
+
+    return CSS_URL.sub(rebase, css)
+
+
+def bundle(app, name, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(app.static_folder, source), encoding='utf-8') as f:
+            content = f.read()
+        if name.endswith('.css'):
+            content = minify_css(rebase_css_urls(content, source, app.static_url_path))
+        parts.append(content)
+
+    # JavaScript is concatenated as is, the libraries are minified already;
+    # the separator ends a last statement without semicolon
+    return ('\n' if name.endswith('.css') else ';\n').join(parts).encode('utf-8')
+
+
+def fingerprinted(name, content):
+    root, extension = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+
+
+def write(path, content):
+    # through a temporary file moved into place, so other workers serving or
+    # building the same file never see it half written
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}{TEMPORARY_SUFFIX}'
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(content)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def build(app, remove=True):
+    # remove=False keeps the files of earlier builds, which other processes
+    # may still be serving
+    dist = os.path.join(app.static_folder, DIST)
+    manifest = {}
+
+    for name, sources in BUNDLES.items():
+        content = bundle(app, name, sources)
+        filename = fingerprinted(name, content)
+        path = os.path.join(dist, filename)
+
+        write(path, content)
+        # mtime=0 keeps the gzip output identical between builds
+        write(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            write(path + '.br', brotli.compress(content))
+
+        manifest[name] = filename
+
+    write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    if remove:
+        remove_stale(dist, manifest)
+    return manifest
+
+
+def remove_stale(dist, manifest):
+    keep = {MANIFEST} | {
+        os.path.normpath(filename + suffix)
+        for filename in manifest.values() for suffix in ('', '.gz', '.br')
+    }
+    for root, dirs, files in os.walk(dist):
+        for file in files:
+            path = os.path.join(root, file)
+            # files being written by another process are not stale
+            if file.endswith(TEMPORARY_SUFFIX):
+                continue
+            if os.path.relpath(path, dist) not in keep:
+                os.remove(path)
+
+
+def sources_changed(app, manifest_path):
+    built = os.path.getmtime(manifest_path)
+    return any(
+        os.path.getmtime(os.path.join(app.static_folder, source)) > built
+        for sources in BUNDLES.values() for source in sources
+    )
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'assets', self.send)
+        app.add_template_global(self.url, 'asset_url')
+        app.cli.add_command(assets_cli)
+        app.extensions['assets'] = self
+
+    def load(self):
+        app = current_app
+        path = os.path.join(app.static_folder, DIST, MANIFEST)
+
+        with self._lock:
+            if os.path.exists(path) and not (app.debug and sources_changed(app, path)):
+                if self.manifest is None or app.debug:
+                    with open(path) as f:
+                        self.manifest = json.load(f)
+            elif app.debug:
+                app.logger.info('building static asset bundles')
+                self.manifest = build(app)
+            else:
+                # every worker gets here on its first request; the builds
+                # write the same files, and none removes what another serves
+                app.logger.warning('static asset bundles missing, building them; '
+                                   'run `flask assets build` before starting the server')
+                self.manifest = build(app, remove=False)
+
+        return self.manifest
+
+    def url(self, name):
+        manifest = self.manifest
+        if manifest is None or current_app.debug:
+            manifest = self.load()
+        return url_for('assets', filename=manifest[name])
+
+    def send(self, filename):
+        directory = os.path.join(current_app.static_folder, DIST)
+        accepted = request.accept_encodings
+
+        for encoding, suffix in ENCODINGS:
+            path = safe_join(directory, filename + suffix)
+            if accepted[encoding] and path and os.path.exists(path):
+                response = send_from_directory(directory, filename + suffix, max_age=IMMUTABLE_MAX_AGE,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(directory, filename, max_age=IMMUTABLE_MAX_AGE)
+
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+assets = app_extension('assets')
+
+
+@assets_cli.command('build', help='Bundle, minify and fingerprint the static assets.')
+def build_command():
+    manifest = build(current_app)
+    for name, filename in sorted(manifest.items()):
+        click.echo(f'{name} -> {DIST}/{filename}')
@@ -0,0 +1,241 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app, jsonify, request
+from sqlalchemy import func, or_
+
+from extensions import app_extension, db
+from models import Venue, Artist
+from search import escape_like, search_document
+
+# Name completion for the navbar search, GET /autocomplete?type=artist&q=blue
+#
+# Every process keeps the names of all venues and artists in memory, as a
+# sorted list of (lower-cased name from the start of a word, id) keys per type,
+# so the names starting with a prefix, or with a word starting with it, are a
+# bisect and a short scan away. The lists are loaded in a background thread on
+# the first request of the process; until they are, names are completed from
+# the database, where the "name city, state" trigram index of search.py serves
+# the match.
+#
+# The write paths update the lists of their own process through add() and
+# remove(). Writes of other processes and of `flask import` show up when the
+# lists are reloaded, every AUTOCOMPLETE_RELOAD_INTERVAL seconds.
+
+MODELS = {'venue': Venue, 'artist': Artist}
+
+
+def word_keys(name):
+    # the name from the start of each of its words
+    name = (name or '').lower()
+    return {name[i:] for i in range(len(name)) if name[i] != ' ' and (i == 0 or name[i - 1] == ' ')}
+
+
+def remove_sorted(items, item):
+    i = bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
+
+
+class PrefixIndex:
+    def __init__(self, rows=()):
+        self.names = {}
+        self.keys = []
+        # (lower-cased name, id) of every name, the order of a page of all names
+        self.ordered = []
+        for id, name in rows:
+            self.names[id] = name
+            self.keys.extend((key, id) for key in word_keys(name))
+            self.ordered.append(((name or '').lower(), id))
+        self.keys.sort()
+        self.ordered.sort()
+
+    def add(self, id, name):
+        self.remove(id)
+        self.names[id] = name
+        for key in word_keys(name):
+            insort(self.keys, (key, id))
+        insort(self.ordered, ((name or '').lower(), id))
+
+    def remove(self, id):
+        name = self.names.pop(id, None)
+        if name is None:
+            return
+        for key in word_keys(name):
+            remove_sorted(self.keys, (key, id))
+        remove_sorted(self.ordered, ((name or '').lower(), id))
+
+    def complete(self, prefix, limit):
+        prefix = prefix.lower()
+        results = []
+        seen = set()
+        for key, id in self.keys[bisect_left(self.keys, (prefix,)):]:
+            if not key.startswith(prefix) or len(results) == limit:
+                break
+            if id not in seen:
+                seen.add(id)
+                results.append({'id': id, 'name': self.names[id]})
+        return results
+
+    def page(self, prefix, offset, limit):
+        # (number of matches, a page of them) of the names with a word
+        # starting with the prefix, or of all names without one
+        prefix = prefix.lower()
+        if not prefix:
+            ids = [id for name, id in self.ordered[offset:offset + limit]]
+            return len(self.ordered), [{'id': id, 'name': self.names[id]} for id in ids]
+
+        ids = {}
+        for i in range(bisect_left(self.keys, (prefix,)), len(self.keys)):
+            key, id = self.keys[i]
+            if not key.startswith(prefix):
+                break
+            ids.setdefault(id)
+        ids = list(ids)
+        return len(ids), [{'id': id, 'name': self.names[id]} for id in ids[offset:offset + limit]]
+
+
+def word_start_criteria(model, prefix):
+    # the names with a word starting with the prefix, like the index; the
+    # '%prefix%' match of the search document is the one its index serves
+    prefix = escape_like(prefix.lower())
+    name = func.lower(model.name)
+    return [
+        search_document(model).like(f'%{prefix}%', escape='\\'),
+        or_(name.like(f'{prefix}%', escape='\\'), name.like(f'% {prefix}%', escape='\\'))
+    ]
+
+
+def complete_from_database(model, prefix, limit):
+    rows = db.session.query(model.id, model.name) \
+        .filter(*word_start_criteria(model, prefix)) \
+        .order_by(model.name, model.id) \
+        .limit(limit) \
+        .all()
+    return [{'id': row.id, 'name': row.name} for row in rows]
+
+
+class Autocomplete:
+    def __init__(self, app=None):
+        self.indexes = None
+        self.loaded_at = None
+        # add()/remove() calls made while the indexes are being loaded, to be
+        # replayed on the loaded ones
+        self.pending = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.add_url_rule('/autocomplete', 'autocomplete', self.view)
+        app.extensions['autocomplete'] = self
+
+    def read_indexes(self):
+        return {
+            kind: PrefixIndex(db.session.query(model.id, model.name))
+            for kind, model in MODELS.items()
+        }
+
+    def load(self, app):
+        with app.app_context():
+            try:
+                indexes = self.read_indexes()
+            except Exception:
+                app.logger.exception('loading the autocomplete indexes failed')
+                indexes = None
+            finally:
+                db.session.remove()
+
+        with self._lock:
+            if indexes is not None:
+                for operation, kind, args in self.pending:
+                    getattr(indexes[kind], operation)(*args)
+                self.indexes = indexes
+            self.loaded_at = time.monotonic()
+            self.pending = None
+
+    def load_now(self):
+        # loads the indexes in the current thread, for commands like `flask
+        # import` that check many ids at once
+        if self.indexes is not None:
+            return
+        indexes = self.read_indexes()
+        with self._lock:
+            if self.indexes is None:
+                self.indexes = indexes
+                self.loaded_at = time.monotonic()
+
+    def reload_due(self):
+        if self.pending is not None:
+            return False
+        return self.loaded_at is None or \
+            time.monotonic() - self.loaded_at > current_app.config['AUTOCOMPLETE_RELOAD_INTERVAL']
+
+    def start_load(self):
+        with self._lock:
+            if not self.reload_due():
+                return
+            self.pending = []
+        app = current_app._get_current_object()
+        threading.Thread(target=self.load, args=(app,), name='autocomplete-load', daemon=True).start()
+
+    def update(self, operation, kind, *args):
+        with self._lock:
+            if self.pending is not None:
+                self.pending.append((operation, kind, args))
+            if self.indexes is not None:
+                getattr(self.indexes[kind], operation)(*args)
+
+    def add(self, kind, id, name):
+        self.update('add', kind, int(id), name)
+
+    def remove(self, kind, id):
+        self.update('remove', kind, int(id))
+
+    def loaded(self):
+        # True once the indexes are there; starts loading them when due
+        if self.reload_due():
+            self.start_load()
+        return self.indexes is not None
+
+    def complete(self, kind, prefix, limit):
+        if not self.loaded():
+            return complete_from_database(MODELS[kind], prefix, limit)
+
+        with self._lock:
+            return self.indexes[kind].complete(prefix, limit)
+
+    # lookups.py reads the names and the show form pickers from the indexes
+    # too; both return None until the indexes are loaded
+
+    def names(self, kind, ids):
+        if not self.loaded():
+            return None
+
+        with self._lock:
+            known = self.indexes[kind].names
+            return {id: known[id] for id in ids if id in known}
+
+    def page(self, kind, prefix, offset, limit):
+        if not self.loaded():
+            return None
+
+        with self._lock:
+            return self.indexes[kind].page(prefix, offset, limit)
+
+    def view(self):
+        kind = request.args.get('type', 'artist')
+        prefix = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int),
+                    current_app.config['AUTOCOMPLETE_LIMIT'])
+
+        if kind not in MODELS:
+            return jsonify({'error': 400, 'message': f'unknown type {kind!r}'}), 400
+        if not prefix or limit < 1:
+            return jsonify({'type': kind, 'q': prefix, 'data': []})
+
+        return jsonify({'type': kind, 'q': prefix, 'data': self.complete(kind, prefix, limit)})
+
+
+autocomplete = app_extension('autocomplete')
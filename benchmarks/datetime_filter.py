@@ -0,0 +1,60 @@
+"""Microbenchmark of the `datetime` Jinja filter, per show tile.
+
+Compares the old path (strftime in the view, dateutil parse + babel
+format_datetime in the filter) with format_datetime() in app.py, which takes
+the datetime as is and reuses a memoized babel pattern.
+
+    python -m benchmarks.datetime_filter [--tiles N]
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from app import format_datetime
+
+
+def old_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tiles', type=int, default=2000, help='number of show tiles per page')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2021, 5, 1, 20, 0)
+    values = [start + timedelta(hours=7 * i) for i in range(args.tiles)]
+
+    for value in values[:50]:
+        old = old_format_datetime(value.strftime('%m/%d/%Y, %H:%M:%S'), 'full')
+        assert format_datetime(value, 'full') == old, (value, old)
+
+    def old_page():
+        for value in values:
+            old_format_datetime(value.strftime('%m/%d/%Y, %H:%M:%S'), 'full')
+
+    def new_page():
+        for value in values:
+            format_datetime(value, 'full')
+
+    old = min(timeit.repeat(old_page, number=1, repeat=args.repeat))
+    new = min(timeit.repeat(new_page, number=1, repeat=args.repeat))
+
+    print(f'{args.tiles} tiles per page')
+    print(f'strftime + parse + format: {old * 1e6 / args.tiles:8.1f} us/tile  {old * 1e3:8.1f} ms/page')
+    print(f'memoized format:           {new * 1e6 / args.tiles:8.1f} us/tile  {new * 1e3:8.1f} ms/page')
+    print(f'speedup:                   {old / new:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Import-time budget for Fyyur.
+
+Every gunicorn worker and every test run pays for importing the app, so the
+time it takes is kept under a budget. Each case runs in a fresh interpreter
+and is timed from inside it. Importing Flask and SQLAlchemy alone takes most
+of the time and varies a lot between machines, so the budgets are for the
+time spent on top of importing the frameworks. The run fails if the median
+of a case is over its budget or a case imported one of the modules that are
+meant to be loaded on first use.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FRAMEWORKS = 'import flask, flask_sqlalchemy, flask_wtf, sqlalchemy.orm'
+
+# (name, code, budget in milliseconds over FRAMEWORKS)
+CASES = [
+    ('models', 'import models', 40),
+    ('app', 'import app', 150),
+    ('create_app', "from app import create_app; create_app('testing')", 175),
+]
+
+# modules that are only imported on first use, see app.py and extensions.py
+LAZY_MODULES = ['dateutil', 'alembic', 'flask_migrate']
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted(sys.modules)}}))
+'''
+
+
+def run_case(code):
+    result = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', PROBE.format(code=code)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    def median(code):
+        runs = [run_case(code) for _ in range(args.runs)]
+        return statistics.median(run['elapsed'] for run in runs) * 1000, runs[0]['modules']
+
+    frameworks = median(FRAMEWORKS)[0]
+    print(f'frameworks: {frameworks:.1f}ms')
+
+    failures = []
+    print(f'{"case":<12} {"total ms":>10} {"own ms":>10} {"budget ms":>10}')
+    for name, code, budget in CASES:
+        total, modules = median(code)
+        own = total - frameworks
+        print(f'{name:<12} {total:>10.1f} {own:>10.1f} {budget:>10}')
+
+        if own > budget:
+            failures.append(f'{name}: {own:.1f}ms, budget {budget}ms')
+        loaded = [module for module in LAZY_MODULES if module in modules]
+        if loaded:
+            failures.append(f'{name}: imports {", ".join(loaded)}')
+
+    for failure in failures:
+        print(f'OVER BUDGET {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
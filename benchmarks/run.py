@@ -0,0 +1,317 @@
+"""Route benchmarks for Fyyur.
+
+Seeds a database with a synthetic dataset (see benchmarks/seed.py), drives
+every route of the app through the Flask test client and reports p50/p95
+latency, the number of SQL queries and the peak memory allocated per request.
+The results are compared with benchmarks/baseline.json and the run fails if a
+route runs more queries than in the baseline, or got slower or bigger than the
+tolerances allow.
+
+    python -m benchmarks.run                      # SQLite in the temp directory
+    python -m benchmarks.run --database-url postgresql://localhost/fyyur_bench
+    python -m benchmarks.run --save-baseline      # record a new baseline
+
+Run it against a throwaway database: it drops and recreates all tables.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+from itertools import count
+from time import perf_counter
+
+from benchmarks import seed
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def setup_app(database_url=None, page_cache=False):
+    from app import create_app
+    from extensions import db
+
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': database_url or 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'fyyur-benchmark.db')
+    }
+    if not page_cache:
+        settings['PAGE_CACHE_TIMEOUT'] = 0
+    return create_app('testing', **settings), db
+
+
+#  Routes
+#  ----------------------------------------------------------------
+
+class Route:
+    def __init__(self, name, method, url, data=None, prepare=None, redirects_to=None, flashes=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        # called before every request, outside of the measurement, and
+        # returns the url to request
+        self.prepare = prepare
+        # where a successful request redirects, so a route whose requests get
+        # rejected fails instead of measuring the rejection
+        self.redirects_to = redirects_to
+        # the flash message of a successful request, for the write routes that
+        # render a page (with status 200) whether they succeed or not
+        self.flashes = flashes
+
+    def request(self, client, url):
+        response = client.open(url, method=self.method, data=self.data)
+        # streamed pages are rendered while the body is read
+        body = response.get_data(as_text=True)
+        response.close()
+        if self.redirects_to is not None and not (response.location or '').endswith(self.redirects_to):
+            raise RuntimeError(f'{self.name}: expected a redirect to {self.redirects_to}, '
+                               f'got {response.status_code} {response.location or ""}')
+        if self.flashes is not None and self.flashes not in body:
+            raise RuntimeError(f'{self.name}: expected the message {self.flashes!r}, '
+                               f'got {response.status_code} without it')
+        return response
+
+
+def routes(app, db):
+    import queries
+    from models import Venue, Artist, Show
+    from sqlalchemy import func
+
+    with app.app_context():
+        busiest_venue = db.session.query(Show.venue_id).group_by(Show.venue_id) \
+            .order_by(func.count(Show.id).desc()).limit(1).scalar()
+        busiest_artist = db.session.query(Show.artist_id).group_by(Show.artist_id) \
+            .order_by(func.count(Show.id).desc()).limit(1).scalar()
+        venue = Venue.query.get(busiest_venue)
+        artist = Artist.query.get(busiest_artist)
+        venues_cursor = queries.venues_page(app.config['VENUES_PER_PAGE'])[1]
+        artists_cursor = queries.artists_page(app.config['ARTISTS_PER_PAGE'])[1]
+        shows_cursor = queries.shows_page(app.config['SHOWS_PER_PAGE'], include_past=True)[1]
+
+        venue_form = {
+            'name': venue.name, 'city': venue.city, 'state': venue.state, 'address': venue.address,
+            'phone': venue.phone, 'image_link': venue.image_link, 'facebook_link': venue.facebook_link,
+            'genres': venue.genres, 'website_link': venue.website, 'seeking_description': venue.seeking_description
+        }
+        artist_form = {
+            'name': artist.name, 'city': artist.city, 'state': artist.state, 'phone': artist.phone,
+            'image_link': artist.image_link, 'facebook_link': artist.facebook_link,
+            'genres': artist.genres, 'website_link': artist.website, 'seeking_description': artist.seeking_description
+        }
+        show_form = {
+            'artist_id': busiest_artist,
+            'venue_id': busiest_venue,
+            'start_time': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def new_venue():
+        with app.app_context():
+            venue = Venue(name='Benchmark Venue', city='Austin', state='TX', genres=['Jazz'])
+            db.session.add(venue)
+            db.session.commit()
+            return f'/venues/{venue.id}'
+
+    # edits send the version they were made from, and every show is listed
+    # in a slot of its own, or they would measure the rejections instead
+    def edit(model, id, form, url):
+        def prepare():
+            with app.app_context():
+                form['version'] = db.session.query(model.version).filter(model.id == id).scalar()
+            return url
+        return prepare
+
+    slots = count()
+
+    def next_show_slot():
+        start_time = datetime.now() + timedelta(days=365, hours=3 * next(slots))
+        show_form['start_time'] = start_time.strftime('%Y-%m-%d %H:%M:%S')
+        return '/shows/create'
+
+    # weekly residencies of ten shows, a year after the single shows and each
+    # in ten weeks of its own
+    residency_form = {'artist_id': busiest_artist, 'venue_id': busiest_venue, 'frequency': 'weekly', 'count': 10}
+    residencies = count()
+
+    def next_residency_slot():
+        start_time = datetime.now() + timedelta(days=730 + 70 * next(residencies))
+        residency_form['start_time'] = start_time.strftime('%Y-%m-%d %H:%M:%S')
+        return '/shows/create/batch'
+
+    return [
+        Route('home', 'GET', '/'),
+        Route('venues', 'GET', '/venues'),
+        Route('venues page 2', 'GET', f'/venues?after={venues_cursor}'),
+        Route('search venues', 'POST', '/venues/search', {'search_term': 'blue'}),
+        Route('search venues by city', 'POST', '/venues/search', {'search_term': 'Austin, TX'}),
+        Route('show venue', 'GET', f'/venues/{busiest_venue}'),
+        Route('create venue form', 'GET', '/venues/create'),
+        Route('create venue', 'POST', '/venues/create', dict(venue_form, name='Benchmark Venue'),
+              flashes='Venue Benchmark Venue was successfully listed!'),
+        Route('edit venue form', 'GET', f'/venues/{busiest_venue}/edit'),
+        Route('edit venue', 'POST', None, venue_form,
+              prepare=edit(Venue, busiest_venue, venue_form, f'/venues/{busiest_venue}/edit'),
+              redirects_to=f'/venues/{busiest_venue}'),
+        Route('delete venue', 'DELETE', None, prepare=new_venue, flashes='was successfully deleted!'),
+        Route('artists', 'GET', '/artists'),
+        Route('artists page 2', 'GET', f'/artists?after={artists_cursor}'),
+        Route('search artists', 'POST', '/artists/search', {'search_term': 'jazz'}),
+        Route('show artist', 'GET', f'/artists/{busiest_artist}'),
+        Route('create artist form', 'GET', '/artists/create'),
+        Route('create artist', 'POST', '/artists/create', dict(artist_form, name='Benchmark Artist'),
+              flashes='Artist Benchmark Artist was successfully listed!'),
+        Route('edit artist form', 'GET', f'/artists/{busiest_artist}/edit'),
+        Route('edit artist', 'POST', None, artist_form,
+              prepare=edit(Artist, busiest_artist, artist_form, f'/artists/{busiest_artist}/edit'),
+              redirects_to=f'/artists/{busiest_artist}'),
+        Route('shows', 'GET', '/shows'),
+        Route('shows with past', 'GET', '/shows?past=1'),
+        Route('shows page 2', 'GET', f'/shows?past=1&after={shows_cursor}'),
+        Route('create show form', 'GET', '/shows/create'),
+        Route('create show', 'POST', None, show_form, prepare=next_show_slot,
+              flashes='Show was successfully listed!'),
+        Route('create show batch', 'POST', None, residency_form, prepare=next_residency_slot,
+              flashes='shows were successfully listed!'),
+        Route('api venues', 'GET', '/api/v1/venues'),
+        Route('api venue', 'GET', f'/api/v1/venues/{busiest_venue}'),
+        Route('api artists', 'GET', '/api/v1/artists'),
+        Route('api artist', 'GET', f'/api/v1/artists/{busiest_artist}'),
+        Route('api search artists', 'GET', '/api/v1/artists/search?q=jazz'),
+        Route('api shows', 'GET', '/api/v1/shows'),
+        Route('autocomplete', 'GET', '/autocomplete?type=artist&q=blue'),
+        Route('artist options', 'GET', '/api/v1/artists/options?q=the'),
+        Route('metrics', 'GET', '/metrics'),
+    ]
+
+
+#  Measurement
+#  ----------------------------------------------------------------
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def measure(client, route, iterations, warmup):
+    from instrumentation import count_queries
+
+    def url():
+        return route.prepare() if route.prepare else route.url
+
+    for _ in range(warmup):
+        route.request(client, url())
+
+    times = []
+    queries = 0
+    statuses = set()
+    for _ in range(iterations):
+        target = url()
+        with count_queries() as stats:
+            start = perf_counter()
+            response = route.request(client, target)
+            times.append(perf_counter() - start)
+        queries = max(queries, stats.count)
+        statuses.add(response.status_code)
+
+    # memory is measured in a separate request, tracing slows everything down
+    target = url()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        route.request(client, target)
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(times, 50) * 1000, 2),
+        'p95_ms': round(percentile(times, 95) * 1000, 2),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+        'status': sorted(statuses)
+    }
+
+
+def compare(results, baseline, latency_tolerance, memory_tolerance):
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if any(status >= 500 for status in result['status']):
+            failures.append(f'{name}: server error {result["status"]}')
+        if result['queries'] > expected['queries']:
+            failures.append(f'{name}: {result["queries"]} queries, baseline {expected["queries"]}')
+        # an absolute slack keeps sub-millisecond routes from failing on noise
+        if result['p95_ms'] > expected['p95_ms'] * (1 + latency_tolerance) + 1:
+            failures.append(f'{name}: p95 {result["p95_ms"]}ms, baseline {expected["p95_ms"]}ms')
+        if result['peak_kib'] > expected['peak_kib'] * (1 + memory_tolerance) + 64:
+            failures.append(f'{name}: peak {result["peak_kib"]}KiB, baseline {expected["peak_kib"]}KiB')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    seed.add_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--page-cache', action='store_true',
+                        help='keep the page cache enabled (by default every request renders)')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--latency-tolerance', type=float, default=1.0,
+                        help='allowed relative p95 increase over the baseline (default: 1.0, i.e. 2x)')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                        help='allowed relative peak memory increase over the baseline')
+    args = parser.parse_args()
+
+    # keeps the table readable, deprecation warnings repeat on every request
+    warnings.simplefilter('ignore', DeprecationWarning)
+    app, db = setup_app(args.database_url, args.page_cache)
+    dataset = {'venues': args.venues, 'artists': args.artists, 'shows': args.shows, 'random_seed': args.random_seed}
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed.seed(db, args.venues, args.artists, args.shows, args.random_seed)
+
+    client = app.test_client()
+    results = {}
+
+    print(f'{"route":<24} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"peak KiB":>10}  status')
+    for route in routes(app, db):
+        result = results[route.name] = measure(client, route, args.iterations, args.warmup)
+        print(f'{route.name:<24} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+              f'{result["queries"]:>8} {result["peak_kib"]:>10.1f}  {",".join(map(str, result["status"]))}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'dataset': dataset, 'routes': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'baseline written to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}, run with --save-baseline first')
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    if baseline['dataset'] != dataset:
+        print(f'baseline was recorded with dataset {baseline["dataset"]}, not comparing')
+        sys.exit(2)
+
+    failures = compare(results, baseline['routes'], args.latency_tolerance, args.memory_tolerance)
+    for failure in failures:
+        print(f'REGRESSION {failure}')
+    if failures:
+        sys.exit(1)
+    print('no regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Synthetic Fyyur dataset for benchmarks.
+
+Generates venues spread over a few dozen cities, artists, and shows whose
+popularity follows a long tail (a few venues and artists have hundreds of
+shows) and whose start times look like real bookings: mostly in the past two
+years, some in the next six months, in the evening, more on weekends.
+
+    python -m benchmarks.seed --database-url sqlite:////tmp/fyyur.db --venues 1000
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from forms import genre_choices
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+    ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+    ('Dallas', 'TX'), ('Austin', 'TX'), ('San Francisco', 'CA'), ('Seattle', 'WA'),
+    ('Denver', 'CO'), ('Nashville', 'TN'), ('Portland', 'OR'), ('Las Vegas', 'NV'),
+    ('Detroit', 'MI'), ('Boston', 'MA'), ('Memphis', 'TN'), ('New Orleans', 'LA'),
+    ('Atlanta', 'GA'), ('Miami', 'FL'), ('Minneapolis', 'MN'), ('Kansas City', 'MO'),
+]
+
+WORDS = [
+    'Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Wild', 'Lucky',
+    'Crystal', 'Iron', 'Neon', 'Hollow', 'Royal', 'Little', 'Grand', 'Black', 'Sunset',
+    'Echo', 'Rose', 'Thunder', 'River', 'Stone', 'Owl', 'Fox', 'Crow', 'Moon', 'Harbor',
+]
+
+VENUE_KINDS = ['Hall', 'Lounge', 'Club', 'Room', 'Theatre', 'Bar', 'Tavern', 'Garden', 'Ballroom']
+ARTIST_KINDS = ['Band', 'Trio', 'Quartet', 'Collective', 'Orchestra', 'Ensemble', 'Project', 'Brothers']
+
+GENRES = [value for value, label in genre_choices]
+
+# weights of Monday..Sunday and of the 18:00..23:00 start hours
+WEEKDAY_WEIGHTS = [4, 5, 7, 10, 20, 22, 9]
+HOUR_WEIGHTS = [6, 10, 18, 24, 20, 10]
+
+
+def name(rng, kinds):
+    return f'{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(kinds)} {rng.randrange(1000)}'
+
+
+def popularity(rng, count):
+    # pareto weights give a long tail of rarely booked entities
+    return [rng.paretovariate(1.2) for _ in range(count)]
+
+
+def start_time(rng, now):
+    # 70% of the shows are in the past two years, 30% in the next six months
+    if rng.random() < 0.7:
+        day = now - timedelta(days=rng.randrange(1, 730))
+    else:
+        day = now + timedelta(days=rng.randrange(0, 180))
+    # move to a weighted weekday of the same week
+    day += timedelta(days=rng.choices(range(7), WEEKDAY_WEIGHTS)[0] - day.weekday())
+    hour = rng.choices(range(18, 24), HOUR_WEIGHTS)[0]
+    return day.replace(hour=hour, minute=rng.choice([0, 30]), second=0, microsecond=0)
+
+
+def venue_rows(rng, count):
+    city_weights = popularity(rng, len(CITIES))
+    for _ in range(count):
+        city, state = rng.choices(CITIES, city_weights)[0]
+        yield {
+            'name': name(rng, VENUE_KINDS),
+            'city': city,
+            'state': state,
+            'address': f'{rng.randrange(1, 9999)} {rng.choice(WORDS)} St',
+            'phone': f'{rng.randrange(200, 999)}-{rng.randrange(100, 999)}-{rng.randrange(1000, 9999)}',
+            'image_link': f'https://images.example.com/venues/{rng.randrange(10 ** 6)}.jpg',
+            'facebook_link': 'https://www.facebook.com/',
+            'genres': rng.sample(GENRES, rng.randint(1, 4)),
+            'website': 'https://www.example.com/',
+            'seeking_talent': rng.random() < 0.4,
+            'seeking_description': 'We are looking for local artists.'
+        }
+
+
+def artist_rows(rng, count):
+    for _ in range(count):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': name(rng, ARTIST_KINDS),
+            'city': city,
+            'state': state,
+            'phone': f'{rng.randrange(200, 999)}-{rng.randrange(100, 999)}-{rng.randrange(1000, 9999)}',
+            'image_link': f'https://images.example.com/artists/{rng.randrange(10 ** 6)}.jpg',
+            'facebook_link': 'https://www.facebook.com/',
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'website': 'https://www.example.com/',
+            'seeking_venue': rng.random() < 0.3,
+            'seeking_description': 'Looking for shows in the area.'
+        }
+
+
+def show_rows(rng, count, venue_ids, artist_ids, now):
+    venue_weights = popularity(rng, len(venue_ids))
+    artist_weights = popularity(rng, len(artist_ids))
+    venues = rng.choices(venue_ids, venue_weights, k=count)
+    artists = rng.choices(artist_ids, artist_weights, k=count)
+    # start times already booked per venue and artist: shows last the default
+    # two hours and start on the half hour, so a show clashes with the shows
+    # starting less than two hours before or after it, which are skipped
+    booked = set()
+    clashes = [timedelta(minutes=30 * step) for step in range(-3, 4)]
+    for venue_id, artist_id in zip(venues, artists):
+        time = start_time(rng, now)
+        if any(('venue', venue_id, time + offset) in booked or ('artist', artist_id, time + offset) in booked
+               for offset in clashes):
+            continue
+        booked.update({('venue', venue_id, time), ('artist', artist_id, time)})
+        yield {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': time
+        }
+
+
+def insert(db, table, rows, batch_size=5000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def seed(db, venues, artists, shows, random_seed=0, now=None):
+    import stats
+    from models import Venue, Artist, Show
+
+    rng = random.Random(random_seed)
+    now = now or datetime.now()
+
+    insert(db, Venue.__table__, venue_rows(rng, venues))
+    insert(db, Artist.__table__, artist_rows(rng, artists))
+    venue_ids = [venue_id for (venue_id,) in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [artist_id for (artist_id,) in db.session.query(Artist.id).order_by(Artist.id)]
+    insert(db, Show.__table__, show_rows(rng, shows, venue_ids, artist_ids, now))
+    stats.refresh_all()
+    db.session.commit()
+
+
+def add_arguments(parser):
+    parser.add_argument('--database-url', default=None,
+                        help='database to seed, by default a SQLite file in the temp directory')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--random-seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from benchmarks.run import setup_app
+
+    app, db = setup_app(args.database_url)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(db, args.venues, args.artists, args.shows, args.random_seed)
+        print(f'seeded {args.venues} venues, {args.artists} artists and {args.shows} shows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from uuid import uuid4
+
+from extensions import app_extension, db
+from models import Show
+
+# Rendered fragments of the venue and artist detail pages are cached by entity
+# id. The write paths that change what a detail page shows invalidate the
+# affected entries explicitly; entries also expire at the start_time of the
+# page's next upcoming show, when that show moves from "upcoming" to "past".
+#
+# The default backend is an in-process LRU, so every worker process keeps its
+# own cache and only sees its own invalidations. Deployments running several
+# workers should plug in a shared backend through PAGE_CACHE_BACKEND: any
+# factory returning an object with cachelib's get/set/delete interface works,
+# e.g. lambda app: cachelib.RedisCache(host='localhost').
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, default_timeout=300):
+        self.maxsize = maxsize
+        self.default_timeout = default_timeout
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        return True
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self.timeout = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = app.config['PAGE_CACHE_TIMEOUT']
+        factory = app.config.get('PAGE_CACHE_BACKEND')
+        if factory is None:
+            self.backend = LRUCache(app.config['PAGE_CACHE_SIZE'], self.timeout)
+        else:
+            self.backend = factory(app)
+        app.extensions['page_cache'] = self
+
+    def get(self, key):
+        if not self.timeout:
+            return None
+        return self.backend.get(key)
+
+    def set(self, key, value, expires_at=None):
+        if not self.timeout:
+            return
+        timeout = self.timeout
+        if expires_at is not None:
+            timeout = min(timeout, math.ceil((expires_at - datetime.now()).total_seconds()))
+        if timeout > 0:
+            self.backend.set(key, value, timeout)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+
+page_cache = app_extension('page_cache')
+
+
+def venue_key(venue_id):
+    return f'venue:{venue_id}'
+
+
+def artist_key(artist_id):
+    return f'artist:{artist_id}'
+
+
+# A venue's name and image appear on the pages of every artist that played
+# there and vice versa, so edits invalidate the other side of their shows too.
+
+def invalidate_venue(venue_id, artist_ids=None):
+    if artist_ids is None:
+        artist_ids = venue_artist_ids(venue_id)
+    page_cache.delete(venue_key(venue_id), *[artist_key(artist_id) for artist_id in artist_ids])
+    invalidate_api()
+
+
+def invalidate_artist(artist_id, venue_ids=None):
+    if venue_ids is None:
+        venue_ids = artist_venue_ids(artist_id)
+    page_cache.delete(artist_key(artist_id), *[venue_key(venue_id) for venue_id in venue_ids])
+    invalidate_api()
+
+
+def invalidate_show(venue_id, artist_id):
+    page_cache.delete(venue_key(venue_id), artist_key(artist_id))
+    invalidate_api()
+
+
+# API responses are cached per URL (see api.py). Listing URLs cannot be
+# enumerated for invalidation, so every API cache key includes a generation
+# token and any write drops the token; the next request picks a new one and
+# misses all entries cached under the old token.
+
+API_GENERATION_KEY = 'api:generation'
+
+
+def api_generation():
+    token = page_cache.get(API_GENERATION_KEY)
+    if token is None:
+        token = uuid4().hex
+        page_cache.set(API_GENERATION_KEY, token)
+    return token
+
+
+def invalidate_api():
+    page_cache.delete(API_GENERATION_KEY)
+
+
+# Values computed from many rows, like the genre facet counts of a listing,
+# are cached under the generation token as well, so any write drops them.
+
+def cached(key, compute):
+    key = f'api:{api_generation()}:{key}'
+    value = page_cache.get(key)
+    if value is None:
+        value = compute()
+        page_cache.set(key, value)
+    return value
+
+
+def venue_artist_ids(venue_id):
+    return [artist_id for (artist_id,) in db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+
+
+def artist_venue_ids(artist_id):
+    return [venue_id for (venue_id,) in db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import os
+import zlib
+
+from flask import current_app, request, session
+
+from extensions import app_extension
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compression and validators for the responses of the app.
+#
+# Responses above COMPRESS_MIN_SIZE bytes with a textual mimetype are gzip
+# compressed, or brotli compressed when the client accepts it and the brotli
+# package of requirements.txt is installed. Streamed pages are gzip compressed chunk by chunk, and
+# each chunk is flushed so the page still renders while it streams; they get
+# no ETag, as their body is not known before it is sent. Files and responses
+# that already have a Content-Encoding (the precompressed assets) are sent as
+# they are.
+#
+# GET responses without an ETag get a weak one computed from the body, and a
+# matching If-None-Match is answered with 304 Not Modified, which saves the
+# transfer but not the rendering. Views that can tell the version of a page
+# without rendering it, like the cached venue and artist pages, set the ETag
+# themselves with page_etag() and check it with not_modified() first.
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.version = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.process)
+        app.extensions['compression'] = self
+
+    #  Validators
+    #  ----------------------------------------------------------------
+
+    def templates_version(self):
+        # pages change with the templates and the asset bundles they link, so
+        # both are part of every page ETag; computed once per process, except
+        # in debug mode where templates change under a running app
+        if self.version is None or current_app.debug:
+            digest = hashlib.sha1()
+            for root, dirs, files in sorted(os.walk(current_app.template_folder)):
+                for name in sorted(files):
+                    with open(os.path.join(root, name), 'rb') as f:
+                        digest.update(f.read())
+            assets = current_app.extensions.get('assets')
+            if assets is not None and assets.manifest is not None:
+                digest.update(json.dumps(assets.manifest, sort_keys=True).encode())
+            self.version = digest.hexdigest()
+        return self.version
+
+    def page_etag(self, *parts):
+        # the rendered page also depends on the endpoint (the active menu item)
+        # and on pending flash messages; pages with flashes get no ETag
+        if session.get('_flashes'):
+            return None
+        key = '\0'.join(map(str, (self.templates_version(), request.endpoint) + parts))
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def not_modified(self, etag):
+        # a 304 response if the client has the page with this ETag, else None
+        if etag is None or not request.if_none_match.contains_weak(etag):
+            return None
+        response = current_app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    #  After request
+    #  ----------------------------------------------------------------
+
+    def process(self, response):
+        if response.direct_passthrough:
+            return response
+
+        if response.is_streamed:
+            if self.should_compress_stream(response):
+                self.compress_stream(response)
+            return response
+
+        if request.method == 'GET' and response.status_code == 200:
+            if 'ETag' not in response.headers:
+                response.add_etag(weak=True)
+            response.make_conditional(request)
+
+        if self.should_compress(response):
+            self.compress(response)
+
+        return response
+
+    def should_compress(self, response):
+        return (
+            response.status_code == 200
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers
+            and response.content_length is not None
+            and response.content_length >= current_app.config['COMPRESS_MIN_SIZE']
+        )
+
+    def should_compress_stream(self, response):
+        return (
+            response.status_code == 200
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers
+        )
+
+    def compress_stream(self, response):
+        response.vary.add('Accept-Encoding')
+        if not request.accept_encodings['gzip']:
+            return
+
+        chunks = response.response
+        level = current_app.config['COMPRESS_LEVEL']
+        charset = response.charset
+
+        def generate():
+            # wbits=31 writes a gzip stream; every chunk is flushed so the
+            # client can render it before the next one is generated
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode(charset)
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+
+        # closing the response has to close the original stream, which ends
+        # the request context of stream_with_context, even if the compressed
+        # one was never iterated
+        if hasattr(chunks, 'close'):
+            response.call_on_close(chunks.close)
+        response.response = generate()
+        response.content_encoding = 'gzip'
+        response.headers.pop('Content-Length', None)
+
+    def compress(self, response):
+        accepted = request.accept_encodings
+        response.vary.add('Accept-Encoding')
+
+        if brotli is not None and accepted['br']:
+            body = brotli.compress(response.get_data(), quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+            encoding = 'br'
+        elif accepted['gzip']:
+            body = gzip.compress(response.get_data(), compresslevel=current_app.config['COMPRESS_LEVEL'])
+            encoding = 'gzip'
+        else:
+            return
+
+        # a strong ETag names the exact bytes, which compression changes
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+
+        response.set_data(body)
+        response.content_encoding = encoding
+
+
+compression = app_extension('compression')
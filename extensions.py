@@ -0,0 +1,30 @@
+import click
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.local import LocalProxy
+
+# The Flask extensions, bound to an app in create_app (app.py). Models and
+# other modules import db from here, so they can be imported without creating
+# the app.
+
+db = SQLAlchemy()
+
+
+# The other extensions keep state of their own, like caches, counters and
+# indexes, so create_app gives every app its own instance of them. Their
+# modules export a proxy to the instance of the current app, e.g.
+# cache.page_cache, and two apps in one process never see each other's state.
+
+def app_extension(name):
+    return LocalProxy(lambda: current_app.extensions[name])
+
+
+def init_migrate(app):
+    # alembic takes about as long to import as the rest of the app and is only
+    # needed by the `flask db` commands, which load the app inside a click
+    # context; web workers skip it
+    if click.get_current_context(silent=True) is None:
+        return
+
+    from flask_migrate import Migrate
+    Migrate(app, db)
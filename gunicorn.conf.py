@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+
+# gunicorn settings, used with `gunicorn -c gunicorn.conf.py wsgi:app`.
+#
+# Requests mostly wait on Postgres, so every worker process runs several
+# threads: a slow request only holds up its own thread. Sizing:
+#
+# - workers: one or two per CPU core. Every worker is a separate Python
+#   process with its own memory, page cache, metrics and connection pool.
+# - threads: requests a worker handles at the same time. Keep it at most
+#   DB_POOL_SIZE + DB_MAX_OVERFLOW (config.py), or threads queue for a
+#   connection and fail after DB_POOL_TIMEOUT seconds.
+# - workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) has to stay below the database's
+#   max_connections, minus what migrations, psql and other clients need.
+#
+# By default there are two workers per core, but no more than the connections
+# the database allows: DB_MAX_CONNECTIONS (Postgres' default of 100) minus
+# DB_RESERVED_CONNECTIONS (10) for other clients, divided by the connections
+# of a worker. On a 2 core machine 4 workers * 4 threads serve 16 requests at
+# once and hold at most 4 * (5 + 5) = 40 connections; from 5 cores on the
+# default stops at 9 workers and 90 connections. WEB_CONCURRENCY overrides it.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+pool_connections = int(os.environ.get('DB_POOL_SIZE', 5)) + int(os.environ.get('DB_MAX_OVERFLOW', 5))
+connection_budget = int(os.environ.get('DB_MAX_CONNECTIONS', 100)) - int(os.environ.get('DB_RESERVED_CONNECTIONS', 10))
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY',
+    max(1, min(multiprocessing.cpu_count() * 2, connection_budget // pool_connections))
+))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# a request running longer than this is killed together with its worker
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# restart workers now and then, which bounds slow memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = '-'
+errorlog = '-'
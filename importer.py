@@ -0,0 +1,242 @@
+import csv
+import json
+import os
+import re
+from itertools import islice
+
+import click
+from flask.cli import AppGroup
+from werkzeug.datastructures import MultiDict
+
+import cache
+import queries
+import show_batch
+import stats
+from autocomplete import autocomplete
+from extensions import db
+from forms import VenueForm, ArtistForm, ShowForm
+from models import Venue, Artist, Show, show_end_time
+
+# Bulk import of venues, artists and shows from CSV or JSONL files:
+#
+#   flask import venues venues.csv
+#   flask import shows shows.jsonl --batch-size 5000 --dry-run
+#
+# Input columns use the names of the web form fields (e.g. website_link,
+# genres). Rows are streamed, validated with the same form classes as the web
+# pages and inserted with one multi-row INSERT and one commit per batch. Rows
+# that fail validation are skipped and reported with their line number. Shows
+# that overlap a listed show of their venue or artist, or an earlier show of
+# their batch, are rejected the same way (see show_clashes). A clash with a
+# show listed concurrently is still caught by the exclusion constraints on
+# Postgres (see models.py), which fail the whole batch.
+#
+# Each inserted batch invalidates what it changes in the page cache, like the
+# write paths of the web pages: the API generation token and, for shows, the
+# detail pages of their venues and artists. With a shared
+# PAGE_CACHE_BACKEND the running workers see this at once; with the default
+# in-process backend the import cannot reach their caches, which then serve
+# stale pages until their entries expire or the workers are restarted.
+
+import_cli = AppGroup('import', help='Bulk import venues, artists and shows.')
+
+FALSE_VALUES = ('', '0', 'f', 'false', 'n', 'no', 'off')
+
+
+def read_rows(file, format):
+    # yields (line number, row dict), with None as the row of unreadable lines
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield line_num, row if isinstance(row, dict) else None
+
+
+def to_formdata(row, form):
+    formdata = MultiDict()
+    for name, value in row.items():
+        if name not in form or value is None:
+            continue
+        if name == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in re.split('[;,]', value) if genre.strip()]
+        if isinstance(value, bool) or name in ('seeking_talent', 'seeking_venue'):
+            value = '' if str(value).strip().lower() in FALSE_VALUES else 'y'
+        if isinstance(value, list):
+            formdata.setlist(name, [str(item) for item in value])
+        else:
+            formdata[name] = str(value)
+    return formdata
+
+
+def venue_row(form):
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'address': form.address.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'genres': form.genres.data,
+        'website': form.website_link.data,
+        'seeking_talent': form.seeking_talent.data,
+        'seeking_description': form.seeking_description.data
+    }
+
+
+def artist_row(form):
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'genres': form.genres.data,
+        'website': form.website_link.data,
+        'seeking_venue': form.seeking_venue.data,
+        'seeking_description': form.seeking_description.data
+    }
+
+
+def show_rows():
+    # ShowForm checks that the ids exist; the name indexes are loaded once per
+    # import instead of looking each row up, see lookups.py
+    autocomplete.load_now()
+    return show_row
+
+
+def show_row(form):
+    return {
+        'artist_id': int(form.artist_id.data),
+        'venue_id': int(form.venue_id.data),
+        'start_time': form.start_time.data,
+        'end_time': show_end_time(form.start_time.data, form.duration.data)
+    }
+
+
+def show_clashes(rows):
+    # {line number: errors} of the (line number, row) pairs of a batch that
+    # overlap a listed show of their venue or artist (one query, see
+    # queries.show_conflicts) or an earlier show of the batch
+    conflicts = queries.show_conflicts([
+        (row['venue_id'], row['artist_id'], row['start_time'], row['end_time']) for line_num, row in rows
+    ])
+    clashing = {}
+    # (end_time, line number) of the latest ending accepted show per venue and
+    # per artist; in start time order a show overlaps an accepted one of its
+    # venue or artist exactly if it starts before that one ends
+    ends = {}
+
+    for line_num, row in sorted(rows, key=lambda pair: (pair[1]['start_time'], pair[0])):
+        messages = []
+        for show in conflicts:
+            if show_batch.clashes(row, show, row['artist_id']):
+                booked = show['artist_name'] if show['artist_id'] == row['artist_id'] else show['venue_name']
+                messages.append(f"{booked} is already booked for show {show['id']} "
+                                f"({show['artist_name']} at {show['venue_name']})")
+        keys = (('venue', row['venue_id']), ('artist', row['artist_id']))
+        for key in keys:
+            if key in ends and row['start_time'] < ends[key][0]:
+                messages.append(f'the {key[0]} is booked by line {ends[key][1]} at that time')
+
+        if messages:
+            clashing[line_num] = {'start_time': messages}
+            continue
+        for key in keys:
+            if key not in ends or row['end_time'] > ends[key][0]:
+                ends[key] = (row['end_time'], line_num)
+
+    return clashing
+
+
+def invalidate(model, rows):
+    if model is Show:
+        pairs = {(row['venue_id'], row['artist_id']) for row in rows}
+        cache.page_cache.delete(*[key for venue_id, artist_id in pairs
+                                  for key in (cache.venue_key(venue_id), cache.artist_key(artist_id))])
+    cache.invalidate_api()
+
+
+def run_import(model, form_class, build_row, file, format, batch_size, dry_run):
+    # a single form instance is re-processed for every row, which is much
+    # cheaper than binding a new form per row
+    form = form_class(formdata=None, meta={'csrf': False})
+    rows = read_rows(file, format)
+    totals = {'inserted': 0, 'rejected': 0}
+
+    for batch_num, batch in enumerate(iter(lambda: list(islice(rows, batch_size)), []), start=1):
+        valid = []
+        errors = []
+
+        for line_num, row in batch:
+            if row is None:
+                errors.append((line_num, {'line': ['not a JSON object']}))
+                continue
+            form.process(to_formdata(row, form))
+            if form.validate():
+                valid.append((line_num, build_row(form)))
+            else:
+                errors.append((line_num, form.errors))
+
+        if model is Show:
+            clashing = show_clashes(valid)
+            errors.extend(sorted(clashing.items()))
+            valid = [(line_num, row) for line_num, row in valid if line_num not in clashing]
+        valid = [row for line_num, row in valid]
+
+        if valid and not dry_run:
+            try:
+                db.session.execute(model.__table__.insert(), valid)
+                if model is Show:
+                    stats.refresh_shows({row['venue_id'] for row in valid}, {row['artist_id'] for row in valid})
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                click.echo(f'batch {batch_num}: insert failed, {len(valid)} rows not imported: {e}', err=True)
+                totals['rejected'] += len(batch)
+                continue
+            invalidate(model, valid)
+
+        totals['inserted'] += len(valid)
+        totals['rejected'] += len(errors)
+
+        verb = 'valid' if dry_run else 'inserted'
+        click.echo(f'batch {batch_num}: {len(valid)} {verb}, {len(errors)} rejected')
+        for line_num, row_errors in sorted(errors, key=lambda error: error[0]):
+            messages = '; '.join(f'{field}: {", ".join(map(str, messages))}' for field, messages in row_errors.items())
+            click.echo(f'  line {line_num}: {messages}', err=True)
+
+    verb = 'would be inserted' if dry_run else 'inserted'
+    click.echo(f"{totals['inserted']} rows {verb}, {totals['rejected']} rejected")
+
+
+def import_command(name, model, form_class, row_builder):
+    # row_builder is called once per import and returns the function turning a
+    # validated form into a row
+    @import_cli.command(name, help=f'Import {name} from a CSV or JSONL file ("-" for stdin).')
+    @click.argument('file', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']),
+                  help='Input format, by default taken from the file extension.')
+    @click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT and commit.')
+    @click.option('--dry-run', is_flag=True, help='Validate the input without inserting anything.')
+    def command(file, format, batch_size, dry_run):
+        if format is None:
+            extension = os.path.splitext(file.name)[1].lower()
+            format = 'jsonl' if extension in ('.jsonl', '.json', '.ndjson') else 'csv'
+        run_import(model, form_class, row_builder(), file, format, batch_size, dry_run)
+
+    return command
+
+
+import_command('venues', Venue, VenueForm, lambda: venue_row)
+import_command('artists', Artist, ArtistForm, lambda: artist_row)
+import_command('shows', Show, ShowForm, show_rows)
@@ -0,0 +1,164 @@
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from extensions import app_extension
+
+# Counts and times the SQL statements run while handling each request.
+#
+# In debug mode the numbers are sent back as X-Query-Count, X-DB-Time and
+# X-Slowest-Query-Time response headers, except on streamed responses, whose
+# headers are sent before their queries run. Requests running more queries than
+# QUERY_COUNT_THRESHOLD or a statement slower than SLOW_QUERY_THRESHOLD seconds
+# are logged with app.logger, and totals are aggregated per endpoint.
+#
+# Tests can check a view's query budget with
+#
+#   with assert_max_queries(2):
+#       client.get('/venues/1')
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.time = 0.0
+        self.max_queries = 0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def add(self, stats):
+        self.requests += 1
+        self.queries += stats.count
+        self.time += stats.time
+        self.max_queries = max(self.max_queries, stats.count)
+        if stats.slowest_time > self.slowest_time:
+            self.slowest_time = stats.slowest_time
+            self.slowest_statement = stats.slowest_statement
+
+
+# every thread keeps a stack of the collectors that are currently counting:
+# the one of the request being handled plus any count_queries() blocks
+_local = threading.local()
+
+
+def _collectors():
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = perf_counter() - conn.info['query_start_time'].pop()
+    for stats in _collectors():
+        stats.record(statement, duration)
+
+
+@contextmanager
+def count_queries():
+    stats = QueryStats()
+    collectors = _collectors()
+    collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        collectors.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(n):
+    with count_queries() as stats:
+        yield stats
+    assert stats.count <= n, f'{stats.count} queries run, at most {n} expected'
+
+
+class QueryInstrumentation:
+    def __init__(self, app=None):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.teardown)
+        app.extensions['query_instrumentation'] = self
+
+    def start(self):
+        g.query_stats = QueryStats()
+        _collectors().append(g.query_stats)
+
+    def finish(self, response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        if response.is_streamed:
+            # the body, and the queries run while it is generated, come after
+            # the headers; the request is recorded in teardown once it is sent
+            g.query_stats_streamed = True
+            return response
+
+        if current_app.debug:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-DB-Time'] = f'{stats.time * 1000:.2f}ms'
+            response.headers['X-Slowest-Query-Time'] = f'{stats.slowest_time * 1000:.2f}ms'
+
+        self.record(stats)
+        return response
+
+    def record(self, stats):
+        app = current_app
+        if stats.count > app.config['QUERY_COUNT_THRESHOLD']:
+            app.logger.warning('%s %s ran %d queries (%.1fms)',
+                               request.method, request.path, stats.count, stats.time * 1000)
+        if stats.slowest_time > app.config['SLOW_QUERY_THRESHOLD']:
+            app.logger.warning('%s %s ran a slow query (%.1fms): %s',
+                               request.method, request.path, stats.slowest_time * 1000, stats.slowest_statement)
+
+        with self._lock:
+            self.endpoints.setdefault(request.endpoint, EndpointStats()).add(stats)
+
+    def teardown(self, exception=None):
+        # streamed responses (see stream_template in app.py) are torn down when
+        # the last chunk has been sent
+        stats = g.pop('query_stats', None)
+        if stats is not None and g.pop('query_stats_streamed', False):
+            self.record(stats)
+        if stats is not None and stats in _collectors():
+            _collectors().remove(stats)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: vars(stats).copy() for endpoint, stats in self.endpoints.items()}
+
+
+query_instrumentation = app_extension('query_instrumentation')
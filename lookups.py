@@ -0,0 +1,86 @@
+from flask import current_app
+from sqlalchemy import func
+from wtforms.validators import ValidationError
+
+from extensions import db
+from models import Venue, Artist
+
+# Names of venues and artists by id, for the venue and artist pickers of the
+# show forms and for checking the ids they submit.
+#
+# They are read from the in-memory name indexes of the navbar autocomplete
+# (see autocomplete.py), which the write paths of venues and artists already
+# keep up to date: checking an id is a dict lookup instead of a query, and the
+# options of a picker, GET /api/v1/artists/options?q=<prefix>&page=<n>, are a
+# bisect into the index. Until the indexes are loaded, both are queried.
+#
+# The indexes see the writes of other processes only when they are reloaded,
+# so an id missing from them is looked up in the database before it is
+# rejected; ids of rows deleted meanwhile fail at the INSERT on the foreign
+# key. `flask import shows` loads the indexes before checking its rows.
+
+MODELS = {'venue': Venue, 'artist': Artist}
+
+
+def indexes():
+    return current_app.extensions['autocomplete']
+
+
+def query_names(kind, ids):
+    model = MODELS[kind]
+    return dict(db.session.query(model.id, model.name).filter(model.id.in_(ids))) if ids else {}
+
+
+def names(kind, ids):
+    # id -> name of those of the ids that are venues or artists
+    ids = set(ids)
+    found = indexes().names(kind, ids)
+    if found is None:
+        return query_names(kind, ids)
+
+    found.update(query_names(kind, ids - found.keys()))
+    return found
+
+
+def name(kind, id):
+    # the name of the venue or artist, None if there is none with this id
+    return names(kind, [id]).get(id)
+
+
+def query_options(kind, prefix, per_page, offset):
+    # imported here, autocomplete imports the forms through search.py
+    from autocomplete import word_start_criteria
+
+    model = MODELS[kind]
+    query = db.session.query(model.id, model.name)
+    if prefix:
+        query = query.filter(*word_start_criteria(model, prefix))
+
+    rows = query.order_by(func.lower(model.name), model.id).limit(per_page).offset(offset).all()
+    return query.count(), [{'id': row.id, 'name': row.name} for row in rows]
+
+
+def options(kind, prefix, per_page, offset):
+    # names with a word that starts with the prefix, as for the navbar
+    # autocomplete, or all names without a prefix
+    prefix = prefix.strip()
+    page = indexes().page(kind, prefix, offset, per_page)
+    if page is None:
+        page = query_options(kind, prefix, per_page, offset)
+
+    count, data = page
+    return {'count': count, 'data': data}
+
+
+class KnownId:
+    # form validator: the field holds the id of an existing venue or artist
+    def __init__(self, kind):
+        self.kind = kind
+
+    def __call__(self, form, field):
+        try:
+            id = int(field.data)
+        except (TypeError, ValueError):
+            raise ValidationError('not a valid id')
+        if name(self.kind, id) is None:
+            raise ValidationError(f'no {self.kind} with id {id}')
@@ -0,0 +1,185 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from flask import Response, g, request, signals, template_rendered, before_render_template
+
+from extensions import app_extension, db
+from instrumentation import query_instrumentation
+
+# Request metrics in the Prometheus text exposition format, served on /metrics:
+# request counts and latency histograms per endpoint, requests in flight,
+# template render times, SQL statistics per endpoint (from instrumentation.py)
+# and database connection pool usage.
+#
+# The numbers are kept per process. With several worker processes each worker
+# reports its own numbers, so scrape them per worker or sum them up.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # bisect_left puts a value equal to a bound into that bound's bucket
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket', dict(labels, le=le), cumulative
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.requests = {}
+        self.latency = {}
+        self.render_time = {}
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.teardown)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+        # template timings need blinker for Flask's signals
+        if getattr(signals, 'signals_available', True):
+            before_render_template.connect(self.start_render, app)
+            template_rendered.connect(self.finish_render, app)
+
+        app.extensions['metrics'] = self
+
+    #  Collection
+    #  ----------------------------------------------------------------
+
+    def start(self):
+        g.metrics_start = perf_counter()
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, response):
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+
+        if response.is_streamed:
+            # the request is timed until its last chunk is sent, in teardown
+            g.metrics_streamed_status = response.status_code
+        else:
+            self.record(start, response.status_code)
+        return response
+
+    def record(self, start, status_code):
+        duration = perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        key = (endpoint, request.method, status_code)
+
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram()
+            self.latency[endpoint].observe(duration)
+
+    def teardown(self, exception=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        status_code = g.pop('metrics_streamed_status', None)
+        if status_code is not None:
+            self.record(start, status_code)
+        with self._lock:
+            self.in_flight -= 1
+
+    def start_render(self, sender, template, context, **extra):
+        g.setdefault('metrics_render_starts', []).append(perf_counter())
+
+    def finish_render(self, sender, template, context, **extra):
+        starts = g.get('metrics_render_starts')
+        if not starts:
+            return
+        duration = perf_counter() - starts.pop()
+        with self._lock:
+            if template.name not in self.render_time:
+                self.render_time[template.name] = Histogram()
+            self.render_time[template.name].observe(duration)
+
+    #  Exposition
+    #  ----------------------------------------------------------------
+
+    def families(self):
+        with self._lock:
+            yield 'fyyur_http_requests_total', 'counter', 'HTTP requests handled.', [
+                ('fyyur_http_requests_total', {'endpoint': endpoint, 'method': method, 'status': status}, count)
+                for (endpoint, method, status), count in sorted(self.requests.items())
+            ]
+            yield 'fyyur_http_request_duration_seconds', 'histogram', 'Time spent handling a request.', [
+                sample
+                for endpoint, histogram in sorted(self.latency.items())
+                for sample in histogram.samples('fyyur_http_request_duration_seconds', {'endpoint': endpoint})
+            ]
+            yield 'fyyur_http_requests_in_flight', 'gauge', 'Requests being handled.', [
+                ('fyyur_http_requests_in_flight', {}, self.in_flight)
+            ]
+            yield 'fyyur_template_render_duration_seconds', 'histogram', 'Time spent rendering a template.', [
+                sample
+                for name, histogram in sorted(self.render_time.items())
+                for sample in histogram.samples('fyyur_template_render_duration_seconds', {'template': name})
+            ]
+
+        queries = sorted(query_instrumentation.snapshot().items(), key=lambda item: str(item[0]))
+        yield 'fyyur_db_queries_total', 'counter', 'SQL statements run while handling requests.', [
+            ('fyyur_db_queries_total', {'endpoint': endpoint or 'unmatched'}, stats['queries']) for endpoint, stats in queries
+        ]
+        yield 'fyyur_db_query_duration_seconds_total', 'counter', 'Time spent running SQL statements.', [
+            ('fyyur_db_query_duration_seconds_total', {'endpoint': endpoint or 'unmatched'}, stats['time']) for endpoint, stats in queries
+        ]
+
+        # SQLite's pools do not have a fixed size
+        pool = db.engine.pool
+        if hasattr(pool, 'checkedout'):
+            yield 'fyyur_db_pool_connections', 'gauge', 'Database connections by state.', [
+                ('fyyur_db_pool_connections', {'state': 'checked_out'}, pool.checkedout()),
+                ('fyyur_db_pool_connections', {'state': 'checked_in'}, pool.checkedin()),
+                ('fyyur_db_pool_connections', {'state': 'overflow'}, max(pool.overflow(), 0)),
+            ]
+            yield 'fyyur_db_pool_size', 'gauge', 'Configured size of the connection pool.', [
+                ('fyyur_db_pool_size', {}, pool.size())
+            ]
+
+    def export(self):
+        lines = []
+        for name, kind, help, samples in self.families():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample, labels, value in samples:
+                lines.append(f'{sample}{format_labels(labels)} {value}')
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+metrics = app_extension('metrics')
@@ -0,0 +1,38 @@
+"""add trigram search indexes
+
+Revision ID: 3f1d2e7b9a04
+Revises: 5142f4e4cd58
+Create Date: 2026-10-18 11:26:05.874112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1d2e7b9a04'
+down_revision = '5142f4e4cd58'
+branch_labels = None
+depends_on = None
+
+
+# Trigram GIN indexes over the "name city, state" document that search.py
+# matches with ILIKE '%term%'. The indexed expression has to stay identical to
+# search.search_document() or Postgres will not use the index.
+# Creating the extension needs a role allowed to do so (pg_trgm is a trusted
+# extension from Postgres 13 on).
+
+SEARCH_DOCUMENT = "lower(coalesce(name, '') || ' ' || coalesce(city, '') || ', ' || coalesce(state, ''))"
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_venue_search_trgm ON venue USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)')
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artist_search_trgm ON artist USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_artist_search_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_venue_search_trgm')
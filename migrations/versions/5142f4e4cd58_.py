@@ -0,0 +1,31 @@
+"""add listing keyset indexes
+
+Revision ID: 5142f4e4cd58
+Revises: 91c9a9c83691
+Create Date: 2026-10-18 10:03:12.540371
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5142f4e4cd58'
+down_revision = '91c9a9c83691'
+branch_labels = None
+depends_on = None
+
+
+# Indexes matching the sort keys /venues and /artists paginate on, built
+# concurrently like the show indexes.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venue_state_city_name_id', 'venue', ['state', 'city', 'name', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_artist_name_id', 'artist', ['name', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artist_name_id', table_name='artist', postgresql_concurrently=True)
+        op.drop_index('ix_venue_state_city_name_id', table_name='venue', postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""index the listing sort keys
+
+Revision ID: 7b2e9c4f1a38
+Revises: e27c4d9b5a16
+Create Date: 2026-10-18 21:12:44.803517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e9c4f1a38'
+down_revision = 'e27c4d9b5a16'
+branch_labels = None
+depends_on = None
+
+
+# /venues and /artists now page on the coalesced, upper-cased sort keys of
+# models.VENUE_SORT_KEY and models.ARTIST_SORT_KEY, which the plain column
+# indexes of 5142f4e4cd58 cannot serve. Built concurrently like those.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venue_sort_key', 'venue', [
+            sa.text("coalesce(state, '')"),
+            sa.text("coalesce(city, '')"),
+            sa.text("upper(coalesce(name, ''))"),
+            'id'
+        ], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_artist_sort_key', 'artist', [
+            sa.text("upper(coalesce(name, ''))"),
+            'id'
+        ], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_artist_name_id', table_name='artist', postgresql_concurrently=True)
+        op.drop_index('ix_venue_state_city_name_id', table_name='venue', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venue_state_city_name_id', 'venue', ['state', 'city', 'name', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_artist_name_id', 'artist', ['name', 'id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_artist_sort_key', table_name='artist', postgresql_concurrently=True)
+        op.drop_index('ix_venue_sort_key', table_name='venue', postgresql_concurrently=True)
@@ -0,0 +1,34 @@
+"""add show lookup indexes
+
+Revision ID: 91c9a9c83691
+Revises: 673d4b52611e
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '91c9a9c83691'
+down_revision = '673d4b52611e'
+branch_labels = None
+depends_on = None
+
+
+# The indexes are built with CREATE INDEX CONCURRENTLY so the migration can run
+# against a live show table without blocking writes. CONCURRENTLY cannot run
+# inside a transaction, hence the autocommit block.
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_show_start_time'), 'show', ['start_time'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_show_start_time'), table_name='show', postgresql_concurrently=True)
+        op.drop_index('ix_show_artist_id_start_time', table_name='show', postgresql_concurrently=True)
+        op.drop_index('ix_show_venue_id_start_time', table_name='show', postgresql_concurrently=True)
@@ -0,0 +1,35 @@
+"""add genre GIN indexes
+
+Revision ID: 9d3b6f1a2c85
+Revises: c4e8a1f0d6b3
+Create Date: 2026-10-18 18:05:37.402611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b6f1a2c85'
+down_revision = 'c4e8a1f0d6b3'
+branch_labels = None
+depends_on = None
+
+
+# GIN indexes for the genre filters of queries.genre_filter(), which match the
+# genres arrays with && (any of the genres) and @> (all of them). Built
+# concurrently so venues and artists can still be written meanwhile.
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venue_genres', 'venue', ['genres'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_artist_genres', 'artist', ['genres'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artist_genres', table_name='artist', postgresql_concurrently=True)
+        op.drop_index('ix_venue_genres', table_name='venue', postgresql_concurrently=True)
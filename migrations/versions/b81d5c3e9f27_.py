@@ -0,0 +1,65 @@
+"""add venue and artist show statistics
+
+Revision ID: b81d5c3e9f27
+Revises: 3f1d2e7b9a04
+Create Date: 2026-10-18 14:02:41.530218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81d5c3e9f27'
+down_revision = '3f1d2e7b9a04'
+branch_labels = None
+depends_on = None
+
+
+# Summary tables read by the listing and search pages, see stats.py. They are
+# backfilled here with the same aggregates as stats.aggregates(); LOCALTIMESTAMP
+# matches the naive local times the app stores in show.start_time.
+
+BACKFILL = """
+INSERT INTO {table} ({key}, upcoming_shows_count, past_shows_count, next_show_time, last_show_time)
+SELECT {key},
+       count(CASE WHEN start_time > LOCALTIMESTAMP THEN id END),
+       count(CASE WHEN start_time <= LOCALTIMESTAMP THEN id END),
+       min(CASE WHEN start_time > LOCALTIMESTAMP THEN start_time END),
+       max(CASE WHEN start_time <= LOCALTIMESTAMP THEN start_time END)
+FROM show
+GROUP BY {key}
+"""
+
+
+def upgrade():
+    op.create_table('venue_stats',
+    sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+    sa.Column('past_shows_count', sa.Integer(), nullable=False),
+    sa.Column('next_show_time', sa.DateTime(), nullable=True),
+    sa.Column('last_show_time', sa.DateTime(), nullable=True),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id')
+    )
+    op.create_index(op.f('ix_venue_stats_next_show_time'), 'venue_stats', ['next_show_time'], unique=False)
+    op.create_table('artist_stats',
+    sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+    sa.Column('past_shows_count', sa.Integer(), nullable=False),
+    sa.Column('next_show_time', sa.DateTime(), nullable=True),
+    sa.Column('last_show_time', sa.DateTime(), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id')
+    )
+    op.create_index(op.f('ix_artist_stats_next_show_time'), 'artist_stats', ['next_show_time'], unique=False)
+
+    op.execute(BACKFILL.format(table='venue_stats', key='venue_id'))
+    op.execute(BACKFILL.format(table='artist_stats', key='artist_id'))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_artist_stats_next_show_time'), table_name='artist_stats')
+    op.drop_table('artist_stats')
+    op.drop_index(op.f('ix_venue_stats_next_show_time'), table_name='venue_stats')
+    op.drop_table('venue_stats')
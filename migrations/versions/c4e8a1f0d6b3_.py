@@ -0,0 +1,40 @@
+"""add created_at, updated_at and version to venue, artist and show
+
+Revision ID: c4e8a1f0d6b3
+Revises: b81d5c3e9f27
+Create Date: 2026-10-18 16:40:12.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f0d6b3'
+down_revision = 'b81d5c3e9f27'
+branch_labels = None
+depends_on = None
+
+
+# Existing rows get the time of the migration as their creation and update
+# time. The server default only backfills them, the app sets both columns
+# itself (see VersionedMixin in models.py).
+
+TABLES = ('venue', 'artist', 'show')
+NOW_UTC = sa.text("timezone('utc', now())")
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('created_at', sa.DateTime(), server_default=NOW_UTC, nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=NOW_UTC, nullable=False))
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        op.alter_column(table, 'created_at', server_default=None)
+        op.alter_column(table, 'updated_at', server_default=None)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, 'version')
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'created_at')
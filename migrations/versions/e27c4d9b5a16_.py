@@ -0,0 +1,47 @@
+"""add show end_time and no-overlap exclusion constraints
+
+Revision ID: e27c4d9b5a16
+Revises: 9d3b6f1a2c85
+Create Date: 2026-10-18 19:21:44.907135
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e27c4d9b5a16'
+down_revision = '9d3b6f1a2c85'
+branch_labels = None
+depends_on = None
+
+
+# Existing shows get the default duration of two hours (DEFAULT_SHOW_DURATION
+# in models.py). Adding the exclusion constraints fails if a venue or an
+# artist already has overlapping shows; those have to be moved or removed
+# first. Creating the btree_gist extension needs a role allowed to do so (it
+# is a trusted extension from Postgres 13 on).
+
+EXCLUSIONS = {
+    'ex_show_venue_id_time': 'venue_id',
+    'ex_show_artist_id_time': 'artist_id',
+}
+
+
+def upgrade():
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute("UPDATE show SET end_time = start_time + interval '2 hours'")
+    op.alter_column('show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_show_end_time_after_start_time', 'show', 'end_time > start_time')
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in EXCLUSIONS.items():
+        op.execute(f'ALTER TABLE show ADD CONSTRAINT {name} '
+                   f'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    for name in EXCLUSIONS:
+        op.drop_constraint(name, 'show')
+    op.drop_constraint('ck_show_end_time_after_start_time', 'show', type_='check')
+    op.drop_column('show', 'end_time')
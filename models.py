@@ -1,10 +1,38 @@
-from app import db
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import declared_attr
+
+from extensions import db
 
 # note: before initializing alembic, I made these changes to the starter code:
 # 1. changed table names to lower case to make it easier to query them in psql
 
-class Venue(db.Model):
+# genres are a Postgres array; SQLite (used for tests and benchmarks) has no
+# array type, so there they are stored as a JSON list instead
+GENRES = db.ARRAY(db.String).with_variant(db.JSON(), 'sqlite')
+
+# Venues, artists and shows record when they were created and last changed,
+# and count their updates in a version column. The version doubles as an
+# optimistic lock: SQLAlchemy adds "AND version = <version read>" to every
+# UPDATE and raises StaleDataError when another transaction got there first.
+# Times are UTC.
+
+class VersionedMixin:
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {'version_id_col': cls.version}
+
+class Venue(VersionedMixin, db.Model):
     __tablename__ = 'venue'
+    # /venues is paginated on VENUE_SORT_KEY, indexed below
+    __table_args__ = (
+        # genre filters, see queries.genre_filter
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -14,7 +42,7 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRES)
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(120))
@@ -23,15 +51,19 @@ class Venue(db.Model):
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
-class Artist(db.Model):
+class Artist(VersionedMixin, db.Model):
     __tablename__ = 'artist'
+    # /artists is paginated on ARTIST_SORT_KEY, indexed below
+    __table_args__ = (
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRES)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
@@ -42,13 +74,95 @@ class Artist(db.Model):
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
-class Show(db.Model):
+
+# Sort keys of the /venues and /artists listings and their keyset cursors.
+# Missing states, cities and names sort as '', since a row comparison with a
+# NULL is never true and would drop the row from every page after the first;
+# names compare in upper case, like the letters of the artists jump index.
+VENUE_SORT_KEY = (
+    db.func.coalesce(Venue.state, ''),
+    db.func.coalesce(Venue.city, ''),
+    db.func.upper(db.func.coalesce(Venue.name, '')),
+    Venue.id,
+)
+ARTIST_SORT_KEY = (
+    db.func.upper(db.func.coalesce(Artist.name, '')),
+    Artist.id,
+)
+db.Index('ix_venue_sort_key', *VENUE_SORT_KEY)
+db.Index('ix_artist_sort_key', *ARTIST_SORT_KEY)
+
+# shows inserted without an end_time last this long
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+def show_end_time(start_time, minutes=None):
+    return start_time + (timedelta(minutes=minutes) if minutes else DEFAULT_SHOW_DURATION)
+
+def default_end_time(context):
+    return show_end_time(context.get_current_parameters()['start_time'])
+
+class Show(VersionedMixin, db.Model):
     __tablename__ = 'show'
+    # the detail pages filter by venue/artist plus a start_time range
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.CheckConstraint('end_time > start_time', name='ck_show_end_time_after_start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(Artist.id), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(Venue.id), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
 
     def __repr__(self):
         return f'<Show {self.id}>'
+
+# A venue or an artist cannot have two shows at overlapping times. Postgres
+# enforces it with an exclusion constraint per side over the [start_time,
+# end_time) ranges, whose GiST indexes also answer queries.show_conflict();
+# the = on the ids in a GiST index needs the btree_gist extension. Other
+# databases rely on the check in queries.show_conflict() alone.
+
+SHOW_EXCLUSION = (
+    'ALTER TABLE show ADD CONSTRAINT {name} '
+    'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)'
+)
+SHOW_EXCLUSIONS = {
+    'ex_show_venue_id_time': 'venue_id',
+    'ex_show_artist_id_time': 'artist_id',
+}
+
+db.event.listen(Show.__table__, 'before_create',
+                db.DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+for name, column in SHOW_EXCLUSIONS.items():
+    db.event.listen(Show.__table__, 'after_create',
+                    db.DDL(SHOW_EXCLUSION.format(name=name, column=column)).execute_if(dialect='postgresql'))
+
+# Show statistics per venue and artist, kept up to date by stats.py so the
+# listing and search pages read the counts instead of aggregating show rows.
+# Venues and artists without shows have no row.
+
+class ShowStatsMixin:
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    # the row is stale once next_show_time has passed
+    next_show_time = db.Column(db.DateTime, index=True)
+    last_show_time = db.Column(db.DateTime)
+
+class VenueStats(ShowStatsMixin, db.Model):
+    __tablename__ = 'venue_stats'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey(Venue.id, ondelete='CASCADE'), primary_key=True)
+
+    def __repr__(self):
+        return f'<VenueStats {self.venue_id}>'
+
+class ArtistStats(ShowStatsMixin, db.Model):
+    __tablename__ = 'artist_stats'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey(Artist.id, ondelete='CASCADE'), primary_key=True)
+
+    def __repr__(self):
+        return f'<ArtistStats {self.artist_id}>'
@@ -0,0 +1,474 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import and_, cast, func, or_, true, tuple_
+from sqlalchemy.dialects import postgresql
+
+from extensions import db
+from forms import genre_choices
+from models import Venue, Artist, Show, VenueStats, VENUE_SORT_KEY, ARTIST_SORT_KEY
+
+# Listing and search pages need each row's number of upcoming shows. They are
+# read from the venue_stats/artist_stats tables kept by stats.py; entities
+# without shows have no stats row, hence the outer join and coalesce.
+
+
+def upcoming_shows_count(stats_model):
+    return func.coalesce(stats_model.upcoming_shows_count, 0).label('num_upcoming_shows')
+
+
+# Listings and searches can be filtered by genre: ?genre=Jazz&genre=Folk
+# matches rows with any of the genres, &match=all rows with all of them. On
+# Postgres the filters are array overlap (&&) and containment (@>), both
+# answered by the GIN indexes on the genres columns (migration 9d3b6f1a2c85).
+
+GENRES = [value for value, label in genre_choices]
+GENRE_MATCHES = ('any', 'all')
+
+
+def genre_arguments(genres, match):
+    # validates ?genre=...&match=... arguments; raises ValueError
+    match = match or 'any'
+    if match not in GENRE_MATCHES:
+        raise ValueError(f'invalid genre match {match!r}')
+    unknown = [genre for genre in genres if genre not in GENRES]
+    if unknown:
+        raise ValueError(f'unknown genres {", ".join(unknown)}')
+    return list(dict.fromkeys(genres)), match
+
+
+def genre_filter(model, genres, match='any'):
+    if db.engine.dialect.name == 'postgresql':
+        array = cast(postgresql.array(genres), postgresql.ARRAY(db.String))
+        return model.genres.op('@>' if match == 'all' else '&&')(array)
+
+    # genres are stored as a JSON list outside of Postgres
+    criteria = [cast(model.genres, db.String).like(f'%"{genre}"%') for genre in genres]
+    return and_(*criteria) if match == 'all' else or_(*criteria)
+
+
+def genre_facets(model, *criteria):
+    # the number of rows matching the criteria per genre, counted by joining
+    # each row to its own genres
+    if db.engine.dialect.name == 'postgresql':
+        genres = func.unnest(model.genres).table_valued('value', name='genre').render_derived()
+    else:
+        genres = func.json_each(model.genres).table_valued('value', name='genre')
+
+    rows = db.session.query(genres.c.value, func.count(model.id)) \
+        .select_from(model) \
+        .join(genres, true()) \
+        .filter(*criteria) \
+        .group_by(genres.c.value) \
+        .all()
+
+    counts = dict(rows)
+    return [{'genre': genre, 'count': counts[genre]} for genre in GENRES if genre in counts]
+
+
+def genre_criteria(model, genres, match):
+    # no genres means no filter
+    return [genre_filter(model, genres, match)] if genres else []
+
+
+# Detail pages load all shows of the venue/artist together with the columns of
+# the other side of the booking in one joined query, then split them into past
+# and upcoming shows in a single pass against one captured "now". The start_time
+# of the next upcoming show is returned too: that is when the split changes.
+
+def split_shows(rows, now=None):
+    now = now or datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    next_show_time = None
+
+    for row in rows:
+        show = row._asdict()
+        if row.start_time > now:
+            upcoming_shows.append(show)
+            if next_show_time is None or row.start_time < next_show_time:
+                next_show_time = row.start_time
+        else:
+            past_shows.append(show)
+
+    return past_shows, upcoming_shows, next_show_time
+
+
+def venue_detail(venue_id):
+    venue = Venue.query.get(venue_id)
+
+    if not venue:
+        return None
+
+    rows = db.session.query(
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Artist, Show.artist_id == Artist.id) \
+        .filter(Show.venue_id == venue_id) \
+        .order_by(Show.start_time.asc()) \
+        .all()
+
+    past_shows, upcoming_shows, next_show_time = split_shows(rows)
+
+    return {
+        'id': venue.id,
+        'name': venue.name,
+        'genres': venue.genres,
+        'city': venue.city,
+        'state': venue.state,
+        'address': venue.address,
+        'phone': venue.phone,
+        'website': venue.website,
+        'facebook_link': venue.facebook_link,
+        'seeking_talent': venue.seeking_talent,
+        'seeking_description': venue.seeking_description,
+        'image_link': venue.image_link,
+        'past_shows': past_shows,
+        'past_shows_count': len(past_shows),
+        'upcoming_shows': upcoming_shows,
+        'upcoming_shows_count': len(upcoming_shows),
+        'next_show_time': next_show_time,
+    }
+
+
+def artist_detail(artist_id):
+    artist = Artist.query.get(artist_id)
+
+    if not artist:
+        return None
+
+    rows = db.session.query(
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.start_time
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .filter(Show.artist_id == artist_id) \
+        .order_by(Show.start_time.asc()) \
+        .all()
+
+    past_shows, upcoming_shows, next_show_time = split_shows(rows)
+
+    return {
+        'id': artist.id,
+        'name': artist.name,
+        'genres': artist.genres,
+        'city': artist.city,
+        'state': artist.state,
+        'phone': artist.phone,
+        'website': artist.website,
+        'facebook_link': artist.facebook_link,
+        'seeking_venue': artist.seeking_venue,
+        'seeking_description': artist.seeking_description,
+        'image_link': artist.image_link,
+        'past_shows': past_shows,
+        'past_shows_count': len(past_shows),
+        'upcoming_shows': upcoming_shows,
+        'upcoming_shows_count': len(upcoming_shows),
+        'next_show_time': next_show_time,
+    }
+
+
+# Paginated listings use keyset (cursor) pagination: a page is "the next N rows
+# after the last row of the previous page" in the listing's sort order, so
+# fetching page 1000 costs the same index range scan as fetching page 1. The
+# cursor handed to the client is the sort key of the last row, serialized to an
+# opaque url-safe string.
+
+def encode_cursor(*values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # raises ValueError on a malformed cursor
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f'invalid cursor {cursor!r}') from e
+    if not isinstance(values, list):
+        raise ValueError(f'invalid cursor {cursor!r}')
+    return values
+
+
+def is_id(value):
+    # bool is an int subclass, but not a primary key
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def after_cursor(columns, cursor):
+    values = decode_cursor(cursor)
+    # every cursor is the row's string sort keys followed by its integer
+    # primary key
+    if (
+        len(values) != len(columns)
+        or not all(isinstance(value, str) for value in values[:-1])
+        or not is_id(values[-1])
+    ):
+        raise ValueError(f'invalid cursor {cursor!r}')
+    return tuple_(*columns) > tuple_(*values)
+
+
+# The HTML listings are rendered while their rows are fetched (see
+# stream_template in app.py). A Page runs its query when it is iterated,
+# reading the rows from a server-side cursor in batches, and yields them
+# one by one. As the query asks for one row more than per_page to find out
+# whether there is a next page, next_cursor is only known once the rows
+# have been iterated.
+
+STREAM_BATCH_SIZE = 100
+
+
+class Page:
+    def __init__(self, query, per_page, cursor, item):
+        self.query = query
+        self.per_page = per_page
+        self.cursor = cursor
+        self.item = item
+        self.next_cursor = None
+
+    def __iter__(self):
+        statement = self.query.limit(self.per_page + 1).statement.execution_options(stream_results=True)
+        result = db.session.execute(statement).yield_per(STREAM_BATCH_SIZE)
+        try:
+            last = None
+            for count, row in enumerate(result):
+                if count == self.per_page:
+                    self.next_cursor = self.cursor(last)
+                    break
+                last = row
+                yield self.item(row)
+        finally:
+            result.close()
+
+
+def show_item(row):
+    return {
+        'venue_id': row.venue_id,
+        'venue_name': row.venue_name,
+        'artist_id': row.artist_id,
+        'artist_name': row.artist_name,
+        'artist_image_link': row.artist_image_link,
+        'start_time': row.start_time
+    }
+
+
+def show_list_query(include_past=False):
+    # the columns of show_item, for the shows feed and show search
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+
+    if not include_past:
+        query = query.filter(Show.start_time > datetime.now())
+
+    return query
+
+
+def shows_stream(per_page, after=None, include_past=False):
+    query = show_list_query(include_past)
+
+    if after:
+        try:
+            start_time, show_id = decode_cursor(after)
+            start_time = datetime.fromisoformat(start_time)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'invalid cursor {after!r}') from e
+        if not is_id(show_id):
+            raise ValueError(f'invalid cursor {after!r}')
+        query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(start_time, show_id))
+
+    return Page(
+        query.order_by(Show.start_time.asc(), Show.id.asc()),
+        per_page,
+        lambda row: encode_cursor(row.start_time, row.id),
+        show_item
+    )
+
+
+def shows_page(per_page, after=None, include_past=False):
+    page = shows_stream(per_page, after, include_past)
+    shows = list(page)
+    return shows, page.next_cursor
+
+
+# The browse pages select only the columns they display, plus their sort key.
+# Artists are paged by (name, id); venues are paged by (state, city, name, id)
+# so the page keeps its city/state grouping, both on the sort keys of
+# models.py. The jump index links are cursors positioned just before the first
+# row of each letter/state.
+
+def sort_key_columns(key):
+    # the key's expressions as sort_0, sort_1, ... columns, for the cursor
+    return [expression.label(f'sort_{i}') for i, expression in enumerate(key[:-1])]
+
+
+def sort_key_cursor(row):
+    values = [value for label, value in row._mapping.items() if label.startswith('sort_')]
+    return encode_cursor(*values, row.id)
+
+
+def venues_stream(per_page, after=None, genres=(), match='any'):
+    columns = VENUE_SORT_KEY
+    query = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        upcoming_shows_count(VenueStats),
+        *sort_key_columns(columns)
+    ).outerjoin(VenueStats, VenueStats.venue_id == Venue.id) \
+        .filter(*genre_criteria(Venue, genres, match))
+
+    if after:
+        query = query.filter(after_cursor(columns, after))
+
+    return Page(
+        query.order_by(*columns),
+        per_page,
+        sort_key_cursor,
+        lambda row: row
+    )
+
+
+def venue_areas(rows):
+    # groups consecutive rows by city, lazily: each area's venues have to be
+    # iterated before the next area
+    for (state, city), area_rows in groupby(rows, key=lambda row: (row.state, row.city)):
+        yield {
+            'city': city,
+            'state': state,
+            'venues': ({
+                'id': row.id,
+                'name': row.name,
+                'num_upcoming_shows': row.num_upcoming_shows
+            } for row in area_rows)
+        }
+
+
+def venues_page(per_page, after=None, genres=(), match='any'):
+    page = venues_stream(per_page, after, genres, match)
+    areas = [dict(area, venues=list(area['venues'])) for area in venue_areas(page)]
+    return areas, page.next_cursor
+
+
+def venue_states_index(genres=(), match='any'):
+    key = VENUE_SORT_KEY[0]
+    rows = db.session.query(key, func.count(Venue.id)) \
+        .filter(*genre_criteria(Venue, genres, match)) \
+        .group_by(key) \
+        .order_by(key) \
+        .all()
+
+    return [{
+        'label': state,
+        'count': count,
+        'cursor': encode_cursor(state, '', '', 0)
+    } for state, count in rows if state]
+
+
+def artists_page(per_page, after=None, genres=(), match='any'):
+    columns = ARTIST_SORT_KEY
+    query = db.session.query(Artist.id, Artist.name, *sort_key_columns(columns)) \
+        .filter(*genre_criteria(Artist, genres, match))
+
+    if after:
+        query = query.filter(after_cursor(columns, after))
+
+    rows = query.order_by(*columns).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = sort_key_cursor(rows[-1])
+
+    return [{'id': row.id, 'name': row.name} for row in rows], next_cursor
+
+
+def artist_letters_index(genres=(), match='any'):
+    letter = func.substr(ARTIST_SORT_KEY[0], 1, 1)
+    rows = db.session.query(letter, func.count(Artist.id)) \
+        .filter(*genre_criteria(Artist, genres, match)) \
+        .group_by(letter) \
+        .order_by(letter) \
+        .all()
+
+    return [{
+        'label': label,
+        'count': count,
+        'cursor': encode_cursor(label, 0)
+    } for label, count in rows if label]
+
+
+# A new show clashes with the shows of the same venue or artist whose
+# [start_time, end_time) range overlaps its own. On Postgres the overlap test
+# is written as the && of the exclusion constraints (see models.py) so both
+# of their GiST indexes answer it; elsewhere it is the equivalent comparison
+# of the bounds, served by the (venue_id, start_time) and (artist_id,
+# start_time) indexes.
+
+def overlaps(start_time, end_time):
+    if db.engine.dialect.name == 'postgresql':
+        return func.tsrange(Show.start_time, Show.end_time).op('&&')(func.tsrange(start_time, end_time))
+    return and_(Show.start_time < end_time, Show.end_time > start_time)
+
+
+def show_conflicts(slots):
+    # the shows clashing with any of the (venue_id, artist_id, start_time,
+    # end_time) slots, in one query
+    if not slots:
+        return []
+
+    rows = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.end_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name')
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(or_(*[
+            and_(or_(Show.venue_id == venue_id, Show.artist_id == artist_id), overlaps(start_time, end_time))
+            for venue_id, artist_id, start_time, end_time in slots
+        ])) \
+        .order_by(Show.start_time.asc(), Show.id.asc()) \
+        .all()
+
+    return [row._asdict() for row in rows]
+
+
+def show_conflict(venue_id, artist_id, start_time, end_time):
+    # the first show clashing with the given one, or None
+    conflicts = show_conflicts([(venue_id, artist_id, start_time, end_time)])
+    return conflicts[0] if conflicts else None
+
+
+def show_detail(show_id):
+    row = db.session.query(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(Show.id == show_id) \
+        .first()
+
+    return row._asdict() if row else None
@@ -0,0 +1,128 @@
+from sqlalchemy import case, func, literal_column, or_, text
+
+from extensions import db
+from forms import genre_choices
+from models import Venue, Artist, Show, VenueStats, ArtistStats
+from queries import genre_criteria, genre_facets, genre_filter, show_item, show_list_query, upcoming_shows_count
+
+# Venue and artist search. A search term matches the name, "city, state" or
+# one of the genres of a row. On Postgres with the pg_trgm extension the
+# name/city/state document is covered by a trigram GIN index (see migration
+# 3f1d2e7b9a04), so the '%term%' match is an index scan and results are ranked
+# by trigram similarity. On other databases, or when the extension is missing,
+# the same query runs as a plain ILIKE scan ranked by prefix matches.
+#
+# Results can be narrowed down to genres like the listings, and come with the
+# per-genre counts of all matching rows, see genre_facets in queries.py.
+#
+# Shows have no text of their own: a show matches when its venue or its artist
+# does, and results are listed in the order of the shows feed.
+
+_trigram_support = {}
+
+
+def trigram_available():
+    engine = db.engine
+    key = str(engine.url)
+
+    if key not in _trigram_support:
+        if engine.dialect.name != 'postgresql':
+            _trigram_support[key] = False
+        else:
+            row = db.session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+            _trigram_support[key] = row is not None
+
+    return _trigram_support[key]
+
+
+def search_document(model):
+    # must stay identical to the indexed expression in the migration
+    return func.lower(
+        func.coalesce(model.name, literal_column("''"))
+        + literal_column("' '")
+        + func.coalesce(model.city, literal_column("''"))
+        + literal_column("', '")
+        + func.coalesce(model.state, literal_column("''"))
+    )
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def genre_criterion(model, term):
+    genres = [value for value, label in genre_choices if term.lower() in value.lower()]
+
+    if not genres:
+        return None
+
+    return genre_filter(model, genres)
+
+
+def match_criteria(model, term):
+    criteria = [search_document(model).ilike(f'%{escape_like(term.lower())}%', escape='\\')]
+
+    genres = genre_criterion(model, term)
+    if genres is not None:
+        criteria.append(genres)
+
+    return or_(*criteria)
+
+
+def rank(model, term):
+    if trigram_available():
+        return func.similarity(search_document(model), term.lower()).label('rank')
+
+    return case((model.name.ilike(f'{escape_like(term)}%', escape='\\'), 1), else_=0).label('rank')
+
+
+def search(model, stats_model, stats_key, term, limit, offset=0, genres=(), match='any'):
+    criteria = [match_criteria(model, term)] + genre_criteria(model, genres, match)
+
+    total = db.session.query(func.count(model.id)).filter(*criteria).scalar()
+    facets = genre_facets(model, *criteria)
+
+    rank_column = rank(model, term)
+    rows = db.session.query(model.id, model.name, upcoming_shows_count(stats_model)) \
+        .outerjoin(stats_model, stats_key == model.id) \
+        .filter(*criteria) \
+        .order_by(rank_column.desc(), model.name.asc(), model.id.asc()) \
+        .limit(limit) \
+        .offset(offset) \
+        .all()
+
+    return {
+        'count': total,
+        'facets': facets,
+        'data': [{
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.num_upcoming_shows
+        } for row in rows]
+    }
+
+
+def search_venues(term, limit, offset=0, genres=(), match='any'):
+    return search(Venue, VenueStats, VenueStats.venue_id, term, limit, offset, genres, match)
+
+
+def search_artists(term, limit, offset=0, genres=(), match='any'):
+    return search(Artist, ArtistStats, ArtistStats.artist_id, term, limit, offset, genres, match)
+
+
+def search_shows(term, limit, offset=0, include_past=False):
+    query = show_list_query(include_past) \
+        .filter(or_(match_criteria(Venue, term), match_criteria(Artist, term)))
+
+    total, next_show_time = query.with_entities(func.count(Show.id), func.min(Show.start_time)).one()
+    rows = query.order_by(Show.start_time.asc(), Show.id.asc()) \
+        .limit(limit) \
+        .offset(offset) \
+        .all()
+
+    return {
+        'count': total,
+        'data': [show_item(row) for row in rows],
+        # the results of every page shift when the first match starts
+        'next_show_time': next_show_time if not include_past else None
+    }
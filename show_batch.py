@@ -0,0 +1,155 @@
+from datetime import datetime
+from itertools import islice
+
+from flask import current_app
+
+import lookups
+import queries
+import stats
+from extensions import db
+from models import Show, show_end_time
+
+# Several shows of one artist are listed at once from /shows/create/batch:
+# a recurrence at one venue (a first start time repeated daily, weekly or
+# monthly, until a date or for a number of shows), a list of
+#
+#   <venue id>, <YYYY-MM-DD HH:MM>
+#
+# lines, or both. All the shows are checked in one pass: the venue and artist
+# ids against the name indexes of lookups.py, clashes with the listed shows
+# with one query (see queries.show_conflicts) and the shows with each other.
+# They are then inserted with one multi-row INSERT and one commit, or, if any
+# of them fails a check, none is. The result of each show is reported back.
+
+
+def recurrence(form, limit):
+    # start times of the recurring shows, at most limit of them; dateutil is
+    # imported on first use
+    from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
+
+    if not form.frequency.data:
+        return [form.start_time.data]
+
+    frequency = {'daily': DAILY, 'weekly': WEEKLY, 'monthly': MONTHLY}[form.frequency.data]
+    rule = rrule(frequency, dtstart=form.start_time.data, interval=form.interval.data or 1,
+                 count=form.count.data, until=form.until.data)
+    return list(islice(rule, limit))
+
+
+def parse_line(line):
+    # raises ValueError
+    venue_id, separator, start_time = line.partition(',')
+    if not separator:
+        raise ValueError('expected "<venue id>, <start time>"')
+    try:
+        venue_id = int(venue_id)
+    except ValueError:
+        raise ValueError(f'{venue_id.strip()!r} is not a venue id') from None
+    try:
+        start_time = datetime.fromisoformat(start_time.strip())
+    except ValueError:
+        raise ValueError(f'{start_time.strip()!r} is not a date and time like 2035-04-01 20:00') from None
+    return venue_id, start_time
+
+
+def new_slot(venue_id, start_time, duration, source):
+    return {
+        'source': source,
+        'venue_id': venue_id,
+        'venue_name': None,
+        'start_time': start_time,
+        'end_time': show_end_time(start_time, duration) if start_time else None,
+        'errors': []
+    }
+
+
+def plan(form):
+    # the shows described by a validated ShowBatchForm, with the errors of
+    # what cannot be read; raises ValueError if there are too many
+    limit = current_app.config['SHOW_BATCH_MAX_SIZE']
+    duration = form.duration.data
+    slots = []
+
+    if form.start_time.data:
+        if form.frequency.data and not (form.count.data or form.until.data):
+            raise ValueError('recurring shows need a count or an end date')
+        try:
+            venue_id = int(form.venue_id.data)
+        except (TypeError, ValueError):
+            raise ValueError('recurring shows need a venue id') from None
+        for number, start_time in enumerate(recurrence(form, limit + 1), start=1):
+            slots.append(new_slot(venue_id, start_time, duration, f'recurrence #{number}'))
+
+    for line_num, line in enumerate((form.dates.data or '').splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            venue_id, start_time = parse_line(line)
+            slots.append(new_slot(venue_id, start_time, duration, f'line {line_num}'))
+        except ValueError as e:
+            slots.append(new_slot(None, None, duration, f'line {line_num}'))
+            slots[-1]['errors'].append(str(e))
+
+    if not slots:
+        raise ValueError('no shows given')
+    if len(slots) > limit:
+        raise ValueError(f'at most {limit} shows can be listed at once')
+
+    return slots
+
+
+def check(artist_id, slots):
+    # adds the errors of every slot; the artist id was checked by ShowBatchForm
+    venue_names = lookups.names('venue', [slot['venue_id'] for slot in slots if slot['venue_id'] is not None])
+
+    readable = []
+    for slot in slots:
+        if slot['errors']:
+            continue
+        if slot['venue_id'] not in venue_names:
+            slot['errors'].append(f"no venue with id {slot['venue_id']}")
+            continue
+        slot['venue_name'] = venue_names[slot['venue_id']]
+        readable.append(slot)
+
+    conflicts = queries.show_conflicts([
+        (slot['venue_id'], artist_id, slot['start_time'], slot['end_time']) for slot in readable
+    ])
+
+    for slot in readable:
+        for show in conflicts:
+            if clashes(slot, show, artist_id):
+                booked = show['artist_name'] if show['artist_id'] == artist_id else show['venue_name']
+                slot['errors'].append(f"{booked} is already booked for show {show['id']} "
+                                      f"({show['artist_name']} at {show['venue_name']})")
+
+    # the artist plays all the shows of the batch, so they must not overlap
+    readable.sort(key=lambda slot: slot['start_time'])
+    for previous, slot in zip(readable, readable[1:]):
+        if slot['start_time'] < previous['end_time']:
+            slot['errors'].append(f"overlaps the show of {previous['source']} in this batch")
+
+
+def clashes(slot, show, artist_id):
+    return (
+        (show['venue_id'] == slot['venue_id'] or show['artist_id'] == artist_id)
+        and show['start_time'] < slot['end_time'] and show['end_time'] > slot['start_time']
+    )
+
+
+def list_shows(artist_id, slots):
+    # checks the slots and inserts them if all pass; returns whether they were
+    # inserted. Commits.
+    check(artist_id, slots)
+    if any(slot['errors'] for slot in slots):
+        return False
+
+    db.session.execute(Show.__table__.insert(), [{
+        'artist_id': artist_id,
+        'venue_id': slot['venue_id'],
+        'start_time': slot['start_time'],
+        'end_time': slot['end_time']
+    } for slot in slots])
+    stats.refresh_shows({slot['venue_id'] for slot in slots}, [artist_id])
+    db.session.commit()
+    return True
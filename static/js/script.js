@@ -2,3 +2,75 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// name completion for the navbar search, see autocomplete.py
+$(function () {
+  $('input[data-autocomplete]').each(function () {
+    var input = $(this);
+    var type = input.data('autocomplete');
+    var list = $('#' + input.attr('list'));
+    var ids = {};
+    var timer = null;
+    var request = null;
+
+    input.on('input', function () {
+      var q = $.trim(input.val());
+      if (ids[q]) {
+        // a completion was picked: go to its page
+        window.location = '/' + type + 's/' + ids[q];
+        return;
+      }
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        if (request) {
+          request.abort();
+        }
+        request = $.getJSON('/autocomplete', {type: type, q: q}, function (response) {
+          ids = {};
+          list.empty();
+          $.each(response.data, function (i, item) {
+            ids[item.name] = item.id;
+            list.append($('<option>').attr('value', item.name));
+          });
+        });
+      }, 150);
+    });
+  });
+});
+
+// venue and artist pickers of the show forms: the id fields suggest the names
+// matching what was typed, see lookups.py
+$(function () {
+  $('input[data-picker]').each(function () {
+    var input = $(this);
+    var type = input.data('picker');
+    var list = $('#' + input.attr('list'));
+    var name = $('#' + input.attr('id') + '-name');
+    var names = {};
+    var timer = null;
+    var request = null;
+
+    input.on('input', function () {
+      var q = $.trim(input.val());
+      name.text(names[q] || '');
+      if (names[q]) {
+        // an option was picked
+        return;
+      }
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        if (request) {
+          request.abort();
+        }
+        request = $.getJSON('/api/v1/' + type + 's/options', {q: q}, function (response) {
+          list.empty();
+          $.each(response.data, function (i, item) {
+            names[item.id] = item.name;
+            list.append($('<option>').attr('value', item.id).text(item.name));
+          });
+          name.text(names[$.trim(input.val())] || '');
+        });
+      }, 150);
+    });
+  });
+});
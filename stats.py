@@ -0,0 +1,182 @@
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import case, exists, func, text
+from sqlalchemy.dialects import postgresql
+
+import cache
+from extensions import app_extension, db
+from models import Show, VenueStats, ArtistStats
+
+# Upcoming/past show counts and next/last show times per venue and artist,
+# stored in the venue_stats and artist_stats tables.
+#
+# Rows are recomputed from the show table when shows are written (see
+# refresh_shows) and when time passes a row's next_show_time, which moves a
+# show from upcoming to past. Each process remembers the earliest
+# next_show_time it has seen and refreshes the stale rows before the first
+# request after it, so reading the counts needs no aggregation. The earliest
+# time is re-read every STATS_CHECK_INTERVAL seconds to notice shows added by
+# other processes.
+#
+#   flask stats refresh      # rebuild all rows
+
+stats_cli = AppGroup('stats', help='Maintain the venue and artist show statistics.')
+
+# (stats model, its key column, the show column it aggregates by)
+TARGETS = (
+    (VenueStats, VenueStats.venue_id, Show.venue_id),
+    (ArtistStats, ArtistStats.artist_id, Show.artist_id),
+)
+
+
+def aggregates(show_fk, now):
+    upcoming = Show.start_time > now
+    return db.session.query(
+        show_fk,
+        func.count(case((upcoming, Show.id))),
+        func.count(case((Show.start_time <= now, Show.id))),
+        func.min(case((upcoming, Show.start_time))),
+        func.max(case((Show.start_time <= now, Show.start_time)))
+    ).group_by(show_fk)
+
+
+STAT_COLUMNS = ['upcoming_shows_count', 'past_shows_count', 'next_show_time', 'last_show_time']
+
+
+def refresh(model, key, show_fk, ids=None, now=None):
+    # recomputes the rows of the given ids, or all rows; does not commit
+    now = now or datetime.now()
+    table = model.__table__
+    rows = aggregates(show_fk, now)
+    # rows of venues/artists that have no show any more
+    gone = table.delete().where(~exists().where(show_fk == key))
+
+    if ids is not None:
+        ids = sorted(ids)
+        if not ids:
+            return
+        rows = rows.filter(show_fk.in_(ids))
+        gone = gone.where(key.in_(ids))
+
+    if db.engine.dialect.name == 'postgresql':
+        # Transactions writing shows of the same venue or artist, and workers
+        # refreshing the same stale rows, run this concurrently. The lock makes
+        # the second one wait for the first to commit, so its aggregates see
+        # the first one's shows; the upsert keeps a full refresh, which takes
+        # no lock, from failing on a row inserted in the meantime.
+        if ids is not None:
+            db.session.execute(ROW_LOCKS, {'table': table.name, 'ids': ids})
+        insert = postgresql.insert(table).from_select([key.name] + STAT_COLUMNS, rows.statement)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=[key.name],
+            set_={column: insert.excluded[column] for column in STAT_COLUMNS}
+        ))
+        db.session.execute(gone)
+    else:
+        db.session.execute(table.delete().where(key.in_(ids)) if ids is not None else table.delete())
+        db.session.execute(table.insert().from_select([key.name] + STAT_COLUMNS, rows.statement))
+
+
+# transaction-scoped advisory locks on the rows of the ids, taken in id order
+ROW_LOCKS = text(
+    'SELECT pg_advisory_xact_lock(hashtext(:table), id) '
+    'FROM (SELECT unnest(CAST(:ids AS integer[])) AS id ORDER BY id) AS ids'
+)
+
+
+def refresh_shows(venue_ids=(), artist_ids=(), now=None):
+    # called by the write paths, in the transaction that changed the shows
+    db.session.flush()
+    refresh(VenueStats, VenueStats.venue_id, Show.venue_id, set(map(int, venue_ids)), now)
+    refresh(ArtistStats, ArtistStats.artist_id, Show.artist_id, set(map(int, artist_ids)), now)
+    show_stats.expire()
+
+
+def refresh_all(now=None):
+    for model, key, show_fk in TARGETS:
+        refresh(model, key, show_fk, now=now)
+    show_stats.expire()
+
+
+def refresh_stale(now=None):
+    # returns the number of rows that were stale
+    now = now or datetime.now()
+    stale = 0
+    for model, key, show_fk in TARGETS:
+        ids = [id for (id,) in db.session.query(key).filter(model.next_show_time <= now)]
+        refresh(model, key, show_fk, ids, now)
+        stale += len(ids)
+    return stale
+
+
+def next_stale_time():
+    times = [db.session.query(func.min(model.next_show_time)).scalar() for model, key, show_fk in TARGETS]
+    times = [time for time in times if time is not None]
+    return min(times) if times else None
+
+
+class ShowStats:
+    def __init__(self, app=None):
+        # next_show_time of the first row to go stale, as far as this process knows
+        self.due = None
+        self.checked_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.refresh_due)
+        app.cli.add_command(stats_cli)
+        app.extensions['show_stats'] = self
+
+    def expire(self):
+        self.checked_at = None
+
+    def needs_check(self, now):
+        if self.checked_at is None:
+            return True
+        if self.due is not None and now >= self.due:
+            return True
+        return now >= self.checked_at + timedelta(seconds=current_app.config['STATS_CHECK_INTERVAL'])
+
+    def refresh_due(self):
+        now = datetime.now()
+        if not self.needs_check(now):
+            return
+
+        with self._lock:
+            if not self.needs_check(now):
+                return
+
+            try:
+                stale = refresh_stale(now)
+                db.session.commit()
+            except Exception:
+                # the counts stay a little stale; the next check retries
+                db.session.rollback()
+                current_app.logger.exception('refreshing the show statistics failed')
+                self.due = None
+                self.checked_at = now
+                return
+
+            # counts in cached API listings changed, here or in another process
+            if stale or (self.due is not None and now >= self.due):
+                cache.invalidate_api()
+
+            self.due = next_stale_time()
+            self.checked_at = now
+
+
+show_stats = app_extension('show_stats')
+
+
+@stats_cli.command('refresh', help='Recompute the statistics of all venues and artists.')
+def refresh_command():
+    refresh_all()
+    db.session.commit()
+    click.echo(f'{db.session.query(VenueStats).count()} venue and '
+               f'{db.session.query(ArtistStats).count()} artist rows refreshed')
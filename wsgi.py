@@ -0,0 +1,19 @@
+import os
+
+from app import create_app
+
+# Entry point for WSGI servers, e.g.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#   uwsgi --http :8000 --module wsgi:app --processes 4 --threads 4
+#
+# Unlike `flask run`, it uses the production configuration unless FYYUR_ENV
+# says otherwise, so a server started without it does not run in debug mode.
+# See gunicorn.conf.py for sizing workers and threads.
+
+app = create_app(os.environ.get('FYYUR_ENV', 'production'))
+
+if __name__ == '__main__':
+    # the development server, one request at a time
+    port = int(os.environ.get('PORT', 5000))
+    app.run(host='0.0.0.0', port=port)